@@ -1,4 +1,5 @@
 from django import forms
+from decimal import Decimal
 from django.forms import inlineformset_factory
 from .models import (Account, Journal, Entry, AccountSubtype)
 
@@ -42,10 +43,10 @@ class EntryForm(forms.ModelForm):
 class BaseJournalEntryInlineFormSet(forms.BaseInlineFormSet):
     def clean(self):
         super().clean()
-        net_credits = 0.0
+        # summed as Decimal: float totals of amounts such as 0.1 + 0.2 - 0.3 are not exactly zero
+        net_credits = Decimal(0)
         for form in self.forms:
-            amount = form.cleaned_data.get('amount') or 0.0
-            net_credits += float(amount)
+            net_credits += form.cleaned_data.get('amount') or Decimal(0)
         if net_credits != 0:
             raise forms.ValidationError('Credits and Debits must total to zero!')
 
@@ -0,0 +1,44 @@
+# Generated by Django 5.2a1 on 2026-10-18 13:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_current_balances(apps, schema_editor):
+    Account = apps.get_model('accounting', 'Account')
+    Entry = apps.get_model('accounting', 'Entry')
+    totals = Entry.objects.filter(account=OuterRef('pk')).values('account').annotate(total=Sum('amount')).values('total')
+    output_field = DecimalField(max_digits=14, decimal_places=2)
+    Account.objects.update(current_balance=Coalesce(Subquery(totals, output_field=output_field), Value(0), output_field=output_field))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0002_commissionperiod'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='current_balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_current_balances, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='AccountBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('closing_balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('last_entry_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='accounting.account')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='account_balances', to='accounting.commissionperiod')),
+            ],
+            options={
+                'unique_together': {('account', 'period')},
+            },
+        ),
+    ]
@@ -1,11 +1,18 @@
 from dateutil.relativedelta import relativedelta
-from django.db.models import Sum
+from decimal import Decimal
+from django.db.models import Case, F, Max, Sum, Value, When
 from django.utils.text import slugify
 from django.utils.timezone import now
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import Signal
 from datetime import datetime, timedelta
 import calendar
 
+# sent with period= inside the period-close transaction, after the account balance snapshot; apps that keep
+# per-period data (e.g. fees' agent statements) connect to it rather than accounting calling into them
+period_closed = Signal()
+
+
 class CommissionPeriod(models.Model):
     end_date = models.DateField(unique=True)  # Last day of the month
     processed = models.BooleanField(default=False)
@@ -31,13 +38,37 @@ class CommissionPeriod(models.Model):
         period, created = cls.objects.get_or_create(end_date=last_day)
         return period
 
+    @classmethod
+    def get_open_period(cls):
+        """
+        Returns the period new work should be assigned to: this month's, or once that has been closed, the first
+        unprocessed period after it, creating it if needed. The period's row is locked for the rest of the caller's
+        transaction, so it cannot be closed while the caller is writing to it.
+        """
+        with transaction.atomic():
+            period = cls.get_create_current_period()
+            while True:
+                period = cls.objects.select_for_update().get(pk=period.pk)
+                if not period.processed:
+                    return period
+                next_last_day = cls.get_last_day_of_month(period.end_date + timedelta(days=1))
+                period, created = cls.objects.get_or_create(end_date=next_last_day)
+
     @classmethod
     def close_and_create_new_period(cls):
-        """Closes the current period and creates a new one for the next month."""
+        """
+        Closes the current period, snapshotting account balances and sending period_closed, and creates the next
+        month's period.
+        """
         current_period = cls.get_create_current_period()
-        if not current_period.processed:
-            current_period.processed = True
-            current_period.save()
+        with transaction.atomic():
+            # waits for commits still writing to the period (see get_open_period), so their fees are included
+            current_period = cls.objects.select_for_update().get(pk=current_period.pk)
+            if not current_period.processed:
+                current_period.processed = True
+                current_period.save()
+                AccountBalance.snapshot(current_period)
+                period_closed.send(sender=cls, period=current_period)
 
         # Create the next month's period
         next_month_date = current_period.end_date + timedelta(days=1)  # First day of next month
@@ -52,7 +83,9 @@ class CommissionPeriod(models.Model):
         return date.replace(day=last_day)
 
     def get_period_fees(self, agent=None, producer=None, bkge_class=None):
-        return Entry.objects.filter(journal_detail__journal__commission_period=self).all()
+        """Fee totals for the period by agent, producer and bkge class, optionally filtered to one of each."""
+        from fees.services.period_reporting import period_fee_totals
+        return period_fee_totals(self, agent=agent, producer=producer, bkge_class=bkge_class)
 
     def __str__(self):
         return f"{self.end_date.strftime('%Y-%m-%d')}"
@@ -63,9 +96,30 @@ class Account(models.Model):
     account_subtype = models.ForeignKey('AccountSubtype', on_delete=models.PROTECT)
     name = models.CharField(max_length=100)
     status = models.CharField(max_length=1)
+    # running total of the account's entries, kept current by the Entry signals and add_to_current_balances
+    current_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
     def balance(self):
-        return self.entries.all().aggregate(balance=Sum('amount')).get('balance') or 0
+        """The latest period-close snapshot plus the entries posted since it was taken."""
+        entries = self.entries.all()
+        opening = 0
+        snapshot = self.balances.order_by('-last_entry_id').first()
+        if snapshot is not None:
+            entries = entries.filter(id__gt=snapshot.last_entry_id)
+            opening = snapshot.closing_balance
+        return opening + (entries.aggregate(balance=Sum('amount')).get('balance') or 0)
+
+    @classmethod
+    def add_to_current_balances(cls, amounts: dict):
+        """Adds {account id: Decimal amount} to current_balance in one UPDATE, for entries created in bulk."""
+        amounts = {account_id: amount for account_id, amount in amounts.items() if amount}
+        if not amounts:
+            return
+        delta = Case(
+            *[When(pk=account_id, then=Value(amount)) for account_id, amount in amounts.items()],
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        )
+        cls.objects.filter(pk__in=amounts).update(current_balance=F('current_balance') + delta)
 
     def __str__(self):
         return f"{self.account_code} - {self.name}"
@@ -90,7 +144,7 @@ class Journal(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __init__(self, *args, **kwargs):
-        super().__init__(args, kwargs)
+        super().__init__(*args, **kwargs)
         self.producer = None
 
     def __str__(self):
@@ -118,6 +172,53 @@ class Entry(models.Model):
             return f"DR {abs(self.amount)} to {self.account.name}"
 
 
+class AccountBalance(models.Model):
+    """
+    An account's closing balance at the end of a commission period, covering every entry up to last_entry_id.
+    Taken for all accounts when the period is closed, so balance reads only sum the entries posted since.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='balances')
+    period = models.ForeignKey(CommissionPeriod, on_delete=models.CASCADE, related_name='account_balances')
+    closing_balance = models.DecimalField(max_digits=14, decimal_places=2)
+    last_entry_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('account', 'period')
+
+    def __str__(self):
+        return f"{self.account} at {self.period}: {self.closing_balance}"
+
+    @classmethod
+    def snapshot(cls, period):
+        """
+        Records every account's closing balance for period: its previous snapshot plus the entries posted since,
+        summed per account in one grouped query.
+        """
+        last_entry_id = Entry.objects.aggregate(last=Max('id'))['last'] or 0
+        previous = {}
+        since = 0
+        latest = cls.objects.exclude(period=period).order_by('-last_entry_id').first()
+        if latest is not None:
+            since = latest.last_entry_id
+            previous = dict(cls.objects.filter(period_id=latest.period_id).values_list('account', 'closing_balance'))
+        movements = dict(
+            Entry.objects.filter(id__gt=since, id__lte=last_entry_id)
+            .values('account').annotate(total=Sum('amount')).values_list('account', 'total')
+        )
+
+        cls.objects.filter(period=period).delete()
+        cls.objects.bulk_create([
+            cls(
+                account_id=account_id,
+                period=period,
+                closing_balance=previous.get(account_id, Decimal(0)) + movements.get(account_id, Decimal(0)),
+                last_entry_id=last_entry_id,
+            )
+            for account_id in Account.objects.values_list('id', flat=True)
+        ])
+
+
 class AccountType(models.Model):
     account_type_code = models.CharField(max_length=8, unique=True)
     name = models.CharField(max_length=50)
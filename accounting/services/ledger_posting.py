@@ -0,0 +1,89 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+import datetime as dt
+
+import numpy as np
+from django.db import transaction
+
+from accounting.models import Account, Entry, Journal
+
+CENT = Decimal('0.01')
+# Entry.amount is a DecimalField(max_digits=10, decimal_places=2)
+MAX_ENTRY_CENTS = 10 ** 10
+
+
+@dataclass
+class LedgerJournal:
+    """A journal to post: lines are (account id, amount) or (account id, amount, description) and must net to zero."""
+    description: str
+    reference: str = ''
+    period_end_date: dt.date | None = None
+    lines: list[tuple] = field(default_factory=list)
+
+
+def to_cents(amount) -> int:
+    """Converts an amount to whole cents exactly, rejecting values with fractions of a cent."""
+    try:
+        value = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+        cents = value / CENT
+        if cents != cents.to_integral_value():
+            raise ValueError(f"Amount {amount} has fractions of a cent.")
+        return int(cents)
+    except InvalidOperation:
+        raise ValueError(f"Amount {amount!r} is not a number.")
+
+
+def post_journals(journals: list[LedgerJournal], status='', batch_size=1000) -> list[Journal]:
+    """
+    Posts many balanced journals at once. Amounts are checked as integer cents, summed per journal in one vectorized
+    pass, and every Journal and Entry row is bulk created in a single transaction. Raises ValueError, posting
+    nothing, if any journal is empty or does not net to zero.
+    """
+    if not journals:
+        return []
+    sizes = np.array([len(journal.lines) for journal in journals], dtype=np.int64)
+    if (sizes == 0).any():
+        empty = [journals[i].reference or i for i in np.flatnonzero(sizes == 0)]
+        raise ValueError(f"Journals without lines: {empty}")
+
+    cents = np.array([to_cents(line[1]) for journal in journals for line in journal.lines], dtype=np.int64)
+    if cents.size and np.abs(cents).max() >= MAX_ENTRY_CENTS:
+        raise ValueError("An amount is too large for a ledger entry.")
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    totals = np.add.reduceat(cents, starts)
+    unbalanced = np.flatnonzero(totals)
+    if unbalanced.size:
+        details = ', '.join(
+            f"{journals[i].reference or i} is out by {Decimal(int(totals[i])) * CENT}" for i in unbalanced[:10]
+        )
+        raise ValueError(f"{unbalanced.size} journal(s) do not balance: {details}")
+
+    with transaction.atomic():
+        created = Journal.objects.bulk_create([
+            Journal(description=journal.description, reference=journal.reference,
+                    period_end_date=journal.period_end_date)
+            for journal in journals
+        ], batch_size=batch_size)
+
+        entries = []
+        account_totals = defaultdict(int)
+        line_cents = iter(cents.tolist())
+        for journal, ledger_journal in zip(created, journals):
+            for line in ledger_journal.lines:
+                account_id = line[0].pk if isinstance(line[0], Account) else line[0]
+                amount_cents = next(line_cents)
+                account_totals[account_id] += amount_cents
+                entries.append(Entry(
+                    journal=journal,
+                    account_id=account_id,
+                    amount=Decimal(amount_cents) * CENT,
+                    description=line[2] if len(line) > 2 else ledger_journal.description,
+                    status=status,
+                ))
+        Entry.objects.bulk_create(entries, batch_size=batch_size)
+        # bulk_create skips the Entry signals that maintain the running balances
+        Account.add_to_current_balances(
+            {account_id: Decimal(total) * CENT for account_id, total in account_totals.items()}
+        )
+    return created
@@ -0,0 +1,35 @@
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from accounting.models import Account, AccountBalance, Entry
+
+
+def add_to_balances(account_id, entry_id, amount):
+    Account.objects.filter(pk=account_id).update(current_balance=F('current_balance') + amount)
+    # an entry already covered by period-close snapshots moves their closing balances too, so balance() agrees
+    AccountBalance.objects.filter(account_id=account_id, last_entry_id__gte=entry_id).update(
+        closing_balance=F('closing_balance') + amount
+    )
+
+
+def remember_posted_amount(sender, instance, **kwargs):
+    # an edited entry first takes back what it previously added to its account
+    instance._posted = None
+    if not instance._state.adding and instance.pk is not None:
+        instance._posted = Entry.objects.filter(pk=instance.pk).values_list('account_id', 'amount').first()
+
+
+def post_entry_amount(sender, instance, **kwargs):
+    posted = getattr(instance, '_posted', None)
+    if posted is not None:
+        add_to_balances(posted[0], instance.pk, -posted[1])
+    add_to_balances(instance.account_id, instance.pk, instance.amount)
+
+
+def reverse_entry_amount(sender, instance, **kwargs):
+    add_to_balances(instance.account_id, instance.pk, -instance.amount)
+
+
+# bulk_create sends no signals, so bulk posting calls Account.add_to_current_balances itself
+pre_save.connect(remember_posted_amount, sender=Entry, dispatch_uid='account_balance_pre_save')
+post_save.connect(post_entry_amount, sender=Entry, dispatch_uid='account_balance_save')
+post_delete.connect(reverse_entry_amount, sender=Entry, dispatch_uid='account_balance_delete')
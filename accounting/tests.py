@@ -1,3 +1,114 @@
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from accounting.models import (Account, AccountBalance, AccountSubtype, AccountType, CommissionPeriod, Entry,
+                               Journal)
+
+
+class AccountBalanceTestCase(TestCase):
+
+    def setUp(self):
+        account_type = AccountType.objects.create(account_type_code='ASSET', name='Asset')
+        subtype = AccountSubtype.objects.create(account_type=account_type, account_subtype_code='CASH', name='Cash')
+        self.cash = Account.objects.create(account_code='1000', account_subtype=subtype, name='Cash', status='A')
+        self.payable = Account.objects.create(account_code='2000', account_subtype=subtype, name='Payable', status='A')
+
+    def post(self, amount):
+        journal = Journal.objects.create(description='Test', reference='T')
+        Entry.objects.create(journal=journal, account=self.cash, amount=amount, status='A')
+        Entry.objects.create(journal=journal, account=self.payable, amount=-amount, status='A')
+        return journal
+
+    def assert_balances(self, cash, payable):
+        for account, expected in [(self.cash, cash), (self.payable, payable)]:
+            account.refresh_from_db()
+            self.assertEqual(account.current_balance, Decimal(expected))
+            self.assertEqual(account.balance(), Decimal(expected))
+
+    def test_current_balance_follows_entries(self):
+        self.post(Decimal('100.10'))
+        journal = self.post(Decimal('0.20'))
+        self.assert_balances('100.30', '-100.30')
+        entry = journal.entries.get(account=self.cash)
+        entry.amount = Decimal('5.00')
+        entry.save()
+        self.assert_balances('105.10', '-100.30')
+        journal.delete()
+        self.assert_balances('100.10', '-100.10')
+
+    def test_balance_reads_snapshot_plus_later_entries(self):
+        self.post(Decimal('100.10'))
+        period = CommissionPeriod.get_create_current_period()
+        CommissionPeriod.close_and_create_new_period()
+        snapshot = AccountBalance.objects.get(account=self.cash, period=period)
+        self.assertEqual(snapshot.closing_balance, Decimal('100.10'))
+        self.post(Decimal('0.20'))
+        with self.assertNumQueries(2):
+            self.assertEqual(self.cash.balance(), Decimal('100.30'))
+        self.assert_balances('100.30', '-100.30')
+
+    def test_snapshots_follow_changes_to_entries_they_cover(self):
+        self.post(Decimal('100.10'))
+        journal = self.post(Decimal('0.20'))
+        CommissionPeriod.get_create_current_period()
+        CommissionPeriod.close_and_create_new_period()
+        self.post(Decimal('1.00'))
+        entry = journal.entries.get(account=self.cash)
+        entry.amount = Decimal('5.00')
+        entry.save()
+        self.assert_balances('106.10', '-101.30')
+        entry.account = self.payable
+        entry.save()
+        self.assert_balances('101.10', '-96.30')
+        journal.delete()
+        self.assert_balances('101.10', '-101.10')
+
+    def test_bulk_posted_amounts_added_in_one_update(self):
+        with self.assertNumQueries(1):
+            Account.add_to_current_balances({self.cash.id: Decimal('1.10'), self.payable.id: Decimal('-1.10')})
+        self.cash.refresh_from_db()
+        self.assertEqual(self.cash.current_balance, Decimal('1.10'))
+
+
+class LedgerPostingTestCase(TestCase):
+
+    def setUp(self):
+        account_type = AccountType.objects.create(account_type_code='ASSET', name='Asset')
+        subtype = AccountSubtype.objects.create(account_type=account_type, account_subtype_code='CASH', name='Cash')
+        self.accounts = [
+            Account.objects.create(account_code=str(1000 + i), account_subtype=subtype, name=f'A{i}', status='A')
+            for i in range(3)
+        ]
+
+    def test_balanced_journals_posted_in_bulk(self):
+        from accounting.services.ledger_posting import LedgerJournal, post_journals
+        cash, first, second = (account.id for account in self.accounts)
+        journals = [
+            LedgerJournal(f'Journal {i}', reference=f'J{i}', lines=[(cash, 0.3), (first, 0.1), (second, '-0.40')])
+            for i in range(50)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            created = post_journals(journals)
+        # one INSERT per bulk_create batch and a single balance UPDATE, however many journals are posted
+        self.assertLess(len(queries), 10)
+        self.assertEqual(len(created), 50)
+        self.assertEqual(Entry.objects.count(), 150)
+        self.assertEqual(Entry.objects.get(journal=created[0], account_id=first).amount, Decimal('0.10'))
+        balances = dict(Account.objects.values_list('id', 'current_balance'))
+        self.assertEqual(balances, {cash: Decimal('15.00'), first: Decimal('5.00'), second: Decimal('-20.00')})
 
-# Create your tests here.
+    def test_unbalanced_journal_posts_nothing(self):
+        from accounting.services.ledger_posting import LedgerJournal, post_journals
+        cash, first, _ = (account.id for account in self.accounts)
+        journals = [
+            LedgerJournal('Good', reference='OK', lines=[(cash, Decimal('1.00')), (first, Decimal('-1.00'))]),
+            LedgerJournal('Bad', reference='BAD', lines=[(cash, Decimal('1.00')), (first, Decimal('-0.99'))]),
+        ]
+        with self.assertRaisesMessage(ValueError, 'BAD is out by 0.01'):
+            post_journals(journals)
+        with self.assertRaisesMessage(ValueError, 'fractions of a cent'):
+            post_journals([LedgerJournal('Half', lines=[(cash, '0.005'), (first, '-0.005')])])
+        self.assertFalse(Journal.objects.exists())
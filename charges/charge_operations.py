@@ -1,41 +1,162 @@
 
-from .models import Charge, ChargeSchedule
-from accounting.models import CommissionPeriod, Entry
+from dataclasses import dataclass
+
+import numpy as np
+from django.db import transaction
 from django.db.models import Q
 
+from .models import Charge, ChargeNettingRun, ChargeSchedule
+from accounting.models import CommissionPeriod
+from fees.models import Fee, JournalDetail
 
-def new_commission_period(commission_period:CommissionPeriod):
-    # close out any outstanding charges that are not being rolled over
-    outstanding_charges = Charge.objects.filter(status='OPEN').all().order_by(
-        'schedule__paying_agent',
-        'commission_period__id',
-        'schedule__priority'
-    )
-    for charge in outstanding_charges:
-        if not charge.schedule.roll_balance:
-            charge.status = 'CLOSED'
-            continue
 
-    # get list of active charge schedules and create charge items for the new commission month
-    schedules = (ChargeSchedule.objects.filter(
-        ~Q(start_date__gte=commission_period.end_date)&~Q(end_date__lte=commission_period.end_date),
-        status='OPEN').all())
-    for schedule in schedules:
-        new_charge = Charge(
-                original_charge=None,
-                schedule=schedule,
-                outstanding_amount=schedule.amount,
-                outstanding_gst=schedule.gst,
-                total_amount=schedule.amount,
-                total_gst=schedule.gst,
-                commission_period=commission_period,
+@dataclass
+class RolloverSummary:
+    closed: int = 0
+    rolled: int = 0
+    created: int = 0
+
+
+def new_commission_period(commission_period: CommissionPeriod) -> RolloverSummary:
+    """
+    Rolls charges over into commission_period in one transaction. A single UPDATE closes the open charges whose
+    schedule does not roll its balance, open charges that do roll are carried forward untouched, and one bulk_create
+    raises this period's charges for every active schedule that does not have one yet.
+    """
+    with transaction.atomic():
+        previous_charges = Charge.objects.filter(status='OPEN').exclude(commission_period=commission_period)
+        closed = previous_charges.filter(schedule__roll_balance=False).update(status='CLOSED')
+        rolled = previous_charges.count()
+
+        # active schedules: started before the period ends and not ended by then
+        schedules = (
+            ChargeSchedule.objects
+            .filter(~Q(start_date__gte=commission_period.end_date) & ~Q(end_date__lte=commission_period.end_date),
+                    status='OPEN')
+            .exclude(charges__commission_period=commission_period)
+            .values_list('id', 'paying_agent_id', 'receiving_agent_id', 'amount', 'gst')
         )
-        new_charge.save()
+        created = Charge.objects.bulk_create([
+            Charge(
+                commission_period=commission_period,
+                schedule_id=schedule_id,
+                paying_agent_id=paying_agent_id,
+                receiving_agent_id=receiving_agent_id,
+                outstanding_amount=amount,
+                outstanding_gst=gst,
+                status='OPEN',
+            )
+            for schedule_id, paying_agent_id, receiving_agent_id, amount, gst in schedules
+        ], batch_size=1000)
+    return RolloverSummary(closed=closed, rolled=rolled, created=len(created))
+
+
+@dataclass
+class NettingSummary:
+    agents: int = 0
+    paid: int = 0
+    part_paid: int = 0
+    netted: float = 0.0
+    details_linked: int = 0
 
 
-def process_outstanding_charges(commission_period:CommissionPeriod):
-    outstanding_charges = Charge.objects.filter(status='OPEN').all().order_by(
-        'schedule__paying_agent',
-        'commission_period__id',
-        'schedule__priority'
+def process_outstanding_charges(commission_period: CommissionPeriod) -> NettingSummary:
+    """
+    Nets each paying agent's open charges against the agent's fees for commission_period, in schedule priority order
+    (oldest period first within a priority). A charge is paid in full while the agent's fees last; after that only
+    charges that allow partial payment take what is left. Open charges from earlier periods are netted only when
+    their schedule rolls its balance. A period is netted once: the run is recorded as a ChargeNettingRun in the same
+    transaction, and later calls for the period change nothing and return an empty summary.
+    """
+    with transaction.atomic():
+        run, created = ChargeNettingRun.objects.get_or_create(commission_period=commission_period)
+        if not created:
+            return NettingSummary()
+        summary = _net_charges(commission_period)
+        run.netted = summary.netted
+        run.save()
+    return summary
+
+
+def _net_charges(commission_period: CommissionPeriod) -> NettingSummary:
+    """
+    Fee totals and charges are loaded as per-agent arrays of cents and allocated in one linear sweep, then the
+    charges and the JournalDetail.related_charge links (each detail whose fees paid a charge) are written with
+    bulk_update.
+    """
+    fees = np.array(
+        Fee.objects.filter(detail__journal__commission_period=commission_period)
+        .order_by('agent_id', 'detail_id')
+        .values_list('agent_id', 'detail_id', 'amount', 'gst'),
+        dtype=np.float64,
+    ).reshape(-1, 4)
+    charges = np.array(
+        Charge.objects.filter(status='OPEN', commission_period__end_date__lte=commission_period.end_date)
+        .filter(Q(commission_period=commission_period) | Q(schedule__roll_balance=True))
+        .order_by('paying_agent_id', 'schedule__priority', 'commission_period__end_date', 'id')
+        .values_list('id', 'paying_agent_id', 'schedule__allow_partial_payment', 'outstanding_amount',
+                     'outstanding_gst'),
+        dtype=np.float64,
+    ).reshape(-1, 5)
+    if not len(fees) or not len(charges):
+        return NettingSummary()
+
+    fee_agents = fees[:, 0].astype(np.int64)
+    fee_details = fees[:, 1].astype(np.int64)
+    fee_cents = np.rint((fees[:, 2] + fees[:, 3]) * 100).astype(np.int64)
+    agent_ids, agent_starts = np.unique(fee_agents, return_index=True)
+    available = dict(zip(agent_ids.tolist(), np.add.reduceat(fee_cents, agent_starts).tolist()))
+
+    charge_ids = charges[:, 0].astype(np.int64)
+    charge_agents = charges[:, 1].astype(np.int64)
+    gst_cents = np.rint(charges[:, 4] * 100).astype(np.int64)
+    due_cents = np.rint(charges[:, 3] * 100).astype(np.int64) + gst_cents
+
+    paid_cents = np.zeros(len(charges), dtype=np.int64)
+    current_agent, remaining = None, 0
+    for i, (agent_id, partial, due) in enumerate(zip(charge_agents.tolist(), charges[:, 2].tolist(),
+                                                      due_cents.tolist())):
+        if agent_id != current_agent:
+            current_agent, remaining = agent_id, max(available.get(agent_id, 0), 0)
+        paid = due if due <= remaining else (remaining if partial else 0)
+        paid_cents[i] = paid
+        remaining -= paid
+
+    paid_rows = np.flatnonzero(paid_cents > 0)
+    left_cents = due_cents - paid_cents
+    left_gst = np.rint(gst_cents * np.divide(left_cents, due_cents, out=np.zeros(len(charges)), where=due_cents > 0))
+    charge_updates = [
+        Charge(id=int(charge_ids[i]), outstanding_amount=float(left_cents[i] - left_gst[i]) / 100,
+               outstanding_gst=float(left_gst[i]) / 100, status='OPEN' if left_cents[i] else 'PAID')
+        for i in paid_rows.tolist()
+    ]
+
+    # each positive fee funds the charge whose slice of the agent's payments contains the fee's starting offset
+    links = {}
+    agent_bounds = np.flatnonzero(np.diff(charge_agents)) + 1
+    for rows in np.split(np.arange(len(charges)), agent_bounds):
+        agent_id = charge_agents[rows[0]]
+        paid_to = np.cumsum(paid_cents[rows])
+        if not paid_to[-1]:
+            continue
+        fee_rows = np.arange(*np.searchsorted(fee_agents, [agent_id, agent_id + 1]))
+        fee_rows = fee_rows[fee_cents[fee_rows] > 0]
+        fee_starts = np.cumsum(fee_cents[fee_rows]) - fee_cents[fee_rows]
+        funding = fee_starts < paid_to[-1]
+        funded_charges = charge_ids[rows][np.searchsorted(paid_to, fee_starts[funding], side='right')]
+        for detail_id, charge_id in zip(fee_details[fee_rows][funding].tolist(), funded_charges.tolist()):
+            # a detail shared by several agents keeps the first charge it paid
+            links.setdefault(detail_id, charge_id)
+
+    Charge.objects.bulk_update(charge_updates, ['outstanding_amount', 'outstanding_gst', 'status'], batch_size=1000)
+    JournalDetail.objects.bulk_update(
+        [JournalDetail(id=detail_id, related_charge_id=charge_id) for detail_id, charge_id in links.items()],
+        ['related_charge'], batch_size=1000,
+    )
+    return NettingSummary(
+        agents=len(set(charge_agents[paid_rows].tolist())),
+        paid=sum(1 for charge in charge_updates if charge.status == 'PAID'),
+        part_paid=sum(1 for charge in charge_updates if charge.status == 'OPEN'),
+        netted=float(paid_cents.sum()) / 100,
+        details_linked=len(links),
     )
@@ -0,0 +1,24 @@
+# Generated by Django 5.2a1 on 2026-10-18 14:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0003_account_balances'),
+        ('charges', '0006_charge_original_charge_nullable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChargeNettingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('netted', models.FloatField(default=0.0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('commission_period', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='netting_run', to='accounting.commissionperiod')),
+            ],
+        ),
+    ]
@@ -38,7 +38,7 @@ class ChargeSchedule(models.Model):
 
 class Charge(models.Model):
     commission_period = models.ForeignKey(CommissionPeriod, on_delete=models.CASCADE, related_name='charges', null=True, blank=True, default=None)
-    original_charge = models.ForeignKey('self', on_delete=models.CASCADE)
+    original_charge = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True)
     schedule = models.ForeignKey(ChargeSchedule, on_delete=models.CASCADE, related_name='charges')
     paying_agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='paying_charges')
     receiving_agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='receiving_charges')
@@ -52,3 +52,13 @@ class Charge(models.Model):
         return f"{self.schedule}: outstanding={self.outstanding_amount}, status={self.status}"
 
 
+
+
+class ChargeNettingRun(models.Model):
+    """Records that a period's charges have been netted against its fees, so they are never netted twice."""
+    commission_period = models.OneToOneField(CommissionPeriod, on_delete=models.CASCADE, related_name='netting_run')
+    netted = models.FloatField(default=0.0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Charges netted for {self.commission_period}: {self.netted}"
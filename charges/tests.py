@@ -1,3 +1,144 @@
+import datetime as dt
+
 from django.test import TestCase
 
-# Create your tests here.
+from accounting.models import CommissionPeriod
+from fees.models import Agent, BkgeClass, Fee, Journal, JournalDetail
+from .models import ChargeType, ChargeSchedule, Charge
+
+
+class ChargeFixtureMixin:
+
+    def setUp(self):
+        self.payer, self.receiver = [
+            Agent.objects.create(agent_code=code, first_name=code, last_name='Agent', abn='1', address_1='1 St',
+                                 email='a@example.com', suburb='X', postcode='1000')
+            for code in ['JON', 'HO1']
+        ]
+        bkge_class = BkgeClass.objects.create(code='FEE', name='Office Fee')
+        self.charge_type = ChargeType.objects.create(code='DESK', name='Desk Fee', bkge_class=bkge_class)
+        self.january = CommissionPeriod.objects.create(end_date=dt.date(2025, 1, 31), processed=True)
+        self.february = CommissionPeriod.objects.create(end_date=dt.date(2025, 2, 28))
+
+    def _schedule(self, roll_balance, start_date=dt.date(2024, 7, 1), end_date=None, status='OPEN', amount=100.0,
+                  priority=0, allow_partial_payment=True, paying_agent=None):
+        return ChargeSchedule.objects.create(
+            charge_type=self.charge_type, paying_agent=paying_agent or self.payer, receiving_agent=self.receiver,
+            frequency='MONTHLY', allow_partial_payment=allow_partial_payment, roll_balance=roll_balance,
+            status=status, priority=priority, start_date=start_date, end_date=end_date, amount=amount,
+            gst=amount / 10)
+
+    def _charge(self, schedule, period, status='OPEN'):
+        return Charge.objects.create(
+            commission_period=period, schedule=schedule, paying_agent=schedule.paying_agent,
+            receiving_agent=schedule.receiving_agent, outstanding_amount=schedule.amount,
+            outstanding_gst=schedule.gst, status=status)
+
+
+class RolloverTestCase(ChargeFixtureMixin, TestCase):
+
+    def test_rollover_closes_rolls_and_creates(self):
+        from charges.charge_operations import new_commission_period
+        rolling = self._schedule(roll_balance=True)
+        expiring = self._schedule(roll_balance=False)
+        self._schedule(roll_balance=False, end_date=dt.date(2025, 1, 31))
+        self._schedule(roll_balance=False, start_date=dt.date(2025, 3, 1))
+        self._schedule(roll_balance=False, status='CLOSED')
+        rolled_charge = self._charge(rolling, self.january)
+        closed_charge = self._charge(expiring, self.january)
+        self._charge(expiring, self.january, status='PAID')
+
+        with self.assertNumQueries(6):
+            summary = new_commission_period(self.february)
+
+        self.assertEqual((summary.closed, summary.rolled, summary.created), (1, 1, 2))
+        closed_charge.refresh_from_db()
+        rolled_charge.refresh_from_db()
+        self.assertEqual(closed_charge.status, 'CLOSED')
+        self.assertEqual(rolled_charge.status, 'OPEN')
+        new_charges = Charge.objects.filter(commission_period=self.february)
+        self.assertEqual(set(new_charges.values_list('schedule', flat=True)), {rolling.id, expiring.id})
+        for charge in new_charges:
+            self.assertEqual((charge.paying_agent, charge.receiving_agent), (self.payer, self.receiver))
+            self.assertEqual((charge.outstanding_amount, charge.outstanding_gst), (100.0, 10.0))
+            self.assertIsNone(charge.original_charge)
+
+    def test_rollover_is_idempotent(self):
+        from charges.charge_operations import new_commission_period
+        self._schedule(roll_balance=False)
+        new_commission_period(self.february)
+        summary = new_commission_period(self.february)
+        self.assertEqual((summary.closed, summary.rolled, summary.created), (0, 0, 0))
+        self.assertEqual(Charge.objects.filter(commission_period=self.february).count(), 1)
+
+
+class NettingTestCase(ChargeFixtureMixin, TestCase):
+
+    def _fee(self, journal, client, agent, amount):
+        detail = JournalDetail.objects.create(
+            journal=journal, client_account=client, bkge_class=self.charge_type.bkge_class, amount=amount,
+            gst=amount / 10, details=client.name, lender_amount=0, lender_gst=0, balance=0, limit=0)
+        Fee.objects.create(agent=agent, detail=detail, amount=amount, gst=amount / 10)
+        return detail
+
+    def setUp(self):
+        super().setUp()
+        from django.contrib.auth.models import User
+        from accounting.models import Account, AccountType, AccountSubtype
+        from fees.models import Producer, ProducerClient
+        account_type = AccountType.objects.create(account_type_code='ASSET', name='Asset')
+        subtype = AccountSubtype.objects.create(account_type=account_type, account_subtype_code='CASH', name='Cash')
+        producer = Producer.objects.create(code='SQ1', name='Square One')
+        journal = Journal.objects.create(
+            commission_period=self.february, period_end_date=self.february.end_date, description='Test',
+            reference='T1', cash_amount=0, producer=producer, status='C',
+            cash_account=Account.objects.create(account_code='1000', account_subtype=subtype, name='Cash', status='A'))
+        client = ProducerClient.objects.create(client_code='1', producer=producer, name='Client',
+                                               created_by=User.objects.create_user(username='test', password='pass'))
+        self.first_detail = self._fee(journal, client, self.payer, 100.0)
+        self.second_detail = self._fee(journal, client, self.payer, 50.0)
+
+    def test_charges_netted_in_priority_order(self):
+        from charges.charge_operations import process_outstanding_charges
+        full = self._charge(self._schedule(roll_balance=False, priority=1, allow_partial_payment=False), self.february)
+        unaffordable = self._charge(
+            self._schedule(roll_balance=False, priority=2, allow_partial_payment=False), self.february)
+        partial = self._charge(self._schedule(roll_balance=False, priority=3), self.february)
+        rolled = self._charge(self._schedule(roll_balance=True, priority=0), self.january)
+        stale = self._charge(self._schedule(roll_balance=False, priority=0), self.january)
+        other_payer = self._charge(self._schedule(roll_balance=False, paying_agent=self.receiver), self.february)
+        rolled.outstanding_amount, rolled.outstanding_gst = 20.0, 2.0
+        rolled.save()
+
+        summary = process_outstanding_charges(self.february)
+
+        self.assertEqual((summary.agents, summary.paid, summary.part_paid), (1, 2, 1))
+        self.assertEqual((summary.netted, summary.details_linked), (165.0, 2))
+        for charge, expected in [(rolled, (0.0, 0.0, 'PAID')), (full, (0.0, 0.0, 'PAID')),
+                                 (unaffordable, (100.0, 10.0, 'OPEN')), (partial, (70.0, 7.0, 'OPEN')),
+                                 (stale, (100.0, 10.0, 'OPEN')), (other_payer, (100.0, 10.0, 'OPEN'))]:
+            charge.refresh_from_db()
+            self.assertEqual((charge.outstanding_amount, charge.outstanding_gst, charge.status), expected)
+        self.first_detail.refresh_from_db()
+        self.second_detail.refresh_from_db()
+        self.assertEqual(self.first_detail.related_charge, rolled)
+        self.assertEqual(self.second_detail.related_charge, full)
+
+    def test_period_is_netted_once(self):
+        from charges.charge_operations import process_outstanding_charges
+        partial = self._charge(self._schedule(roll_balance=False), self.february)
+        skipped = self._charge(self._schedule(roll_balance=False, amount=1000.0, allow_partial_payment=False),
+                               self.february)
+        self.assertEqual(process_outstanding_charges(self.february).netted, 110.0)
+        self.assertEqual(process_outstanding_charges(self.february).netted, 0.0)
+        partial.refresh_from_db()
+        skipped.refresh_from_db()
+        self.assertEqual((partial.outstanding_amount, partial.status), (0.0, 'PAID'))
+        self.assertEqual((skipped.outstanding_amount, skipped.status), (1000.0, 'OPEN'))
+        self.assertEqual(self.february.netting_run.netted, 110.0)
+
+    def test_nothing_to_net(self):
+        from charges.charge_operations import process_outstanding_charges
+        summary = process_outstanding_charges(self.january)
+        self.assertEqual(summary.netted, 0.0)
+        self.assertFalse(JournalDetail.objects.filter(related_charge__isnull=False).exists())
@@ -134,6 +134,19 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
+# Uploaded files (journal upload jobs keep their file here until processed)
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Parsed producer files, cached by content hash so repeat uploads skip parsing
+
+PARSE_CACHE_DIR = BASE_DIR / 'cache' / 'parsed'
+PARSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Ledger account credited with fees for agents that have no payable account of their own
+
+AGENT_PAYABLE_ACCOUNT_CODE = '2999'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -98,6 +98,16 @@ class DeleteConfirmForm(forms.Form):
 
 class UploadFileForm(forms.Form):
     file = forms.FileField()
+    stream = forms.BooleanField(required=False, label='Stream in chunks (large files)')
+    background = forms.BooleanField(required=False, label='Process in background')
+
+
+class BatchUploadFileForm(forms.Form):
+    journal = forms.ModelChoiceField(queryset=Journal.objects.filter(status='OPEN').select_related('producer'))
+    file = forms.FileField()
+
+
+BatchUploadFormSet = forms.formset_factory(BatchUploadFileForm, extra=20)
 
 
 # TODO
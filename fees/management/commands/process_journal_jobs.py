@@ -0,0 +1,55 @@
+import datetime as dt
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from fees.models import JournalJob
+from fees.services.journal_batch_upload import run_upload_batch
+from fees.services.journal_jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Runs queued journal upload and commit jobs on a pool of worker threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Seconds without a heartbeat before a running job is requeued.')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+        parser.add_argument('--upload-batch', type=int, default=20,
+                            help='Most queued uploads a worker claims together and parses on a process pool.')
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs(dt.timedelta(seconds=options['stale_after']))
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale jobs.')
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            workers = [pool.submit(self.work, options) for _ in range(options['workers'])]
+            for worker in workers:
+                worker.result()
+
+    def work(self, options):
+        try:
+            while True:
+                close_old_connections()
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll_interval'])
+                    requeue_stale_jobs(dt.timedelta(seconds=options['stale_after']))
+                    continue
+                if job.kind == JournalJob.UPLOAD:
+                    jobs = [job]
+                    while len(jobs) < options['upload_batch'] and (upload := claim_next_job(JournalJob.UPLOAD)):
+                        jobs.append(upload)
+                    self.stdout.write(f'Running {", ".join(str(job) for job in jobs)}')
+                    run_upload_batch(jobs)
+                    continue
+                self.stdout.write(f'Running {job}')
+                run_job(job)
+        finally:
+            connection.close()
@@ -0,0 +1,42 @@
+# Generated by Django 5.2a1 on 2026-10-18 13:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fees', '0012_rename_client_account_code_journaldetail_client_account'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=10)),
+                ('status', models.CharField(default='QUEUED', max_length=10)),
+                ('file', models.FileField(blank=True, null=True, upload_to='journal_uploads/')),
+                ('attempts', models.IntegerField(default=0)),
+                ('rows_parsed', models.IntegerField(default=0)),
+                ('details_inserted', models.IntegerField(default=0)),
+                ('rows_dropped', models.IntegerField(default=0)),
+                ('fees_generated', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='journal_jobs', to=settings.AUTH_USER_MODEL)),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='fees.journal')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='journaldetail',
+            name='upload_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='details', to='fees.journaljob'),
+        ),
+    ]
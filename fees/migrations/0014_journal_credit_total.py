@@ -0,0 +1,33 @@
+# Generated by Django 5.2a1 on 2026-10-18 13:33
+
+from django.db import migrations, models
+from django.db.models import FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_credit_totals(apps, schema_editor):
+    Journal = apps.get_model('fees', 'Journal')
+    JournalDetail = apps.get_model('fees', 'JournalDetail')
+    totals = (
+        JournalDetail.objects.filter(journal=OuterRef('pk'))
+        .values('journal')
+        .annotate(total=Sum('amount') + Sum('gst'))
+        .values('total')
+    )
+    Journal.objects.update(credit_total=Coalesce(Subquery(totals, output_field=FloatField()), Value(0.0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fees', '0013_journaljob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journal',
+            name='credit_total',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(backfill_credit_totals, migrations.RunPython.noop),
+    ]
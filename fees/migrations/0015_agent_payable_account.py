@@ -0,0 +1,25 @@
+# Generated by Django 5.2a1 on 2026-10-18 13:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0003_account_balances'),
+        ('fees', '0014_journal_credit_total'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='payable_account',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='payable_agents', to='accounting.account'),
+        ),
+        migrations.AddField(
+            model_name='journal',
+            name='ledger_journal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fee_journals', to='accounting.journal'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2a1 on 2026-10-18 13:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0003_account_balances'),
+        ('fees', '0015_agent_payable_account'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentStatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal_reference', models.CharField(max_length=50)),
+                ('client_code', models.CharField(max_length=50)),
+                ('client_name', models.CharField(max_length=100)),
+                ('details', models.CharField(max_length=100)),
+                ('amount', models.FloatField()),
+                ('gst', models.FloatField()),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statement_lines', to='fees.agent')),
+                ('bkge_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fees.bkgeclass')),
+                ('fee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statement_lines', to='fees.fee')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statement_lines', to='accounting.commissionperiod')),
+                ('producer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fees.producer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'agent'], name='fees_agents_period__f2eac5_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AgentStatementSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.FloatField()),
+                ('total_gst', models.FloatField()),
+                ('fee_count', models.IntegerField()),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statement_summaries', to='fees.agent')),
+                ('bkge_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fees.bkgeclass')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statement_summaries', to='accounting.commissionperiod')),
+                ('producer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fees.producer')),
+            ],
+            options={
+                'unique_together': {('period', 'agent', 'producer', 'bkge_class')},
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2a1 on 2026-10-18 14:05
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'fees_producerclient_fts'
+
+CREATE_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        client_code, name, content='fees_producerclient', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON fees_producerclient BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, client_code, name) VALUES (new.id, new.client_code, new.name);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON fees_producerclient BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, client_code, name)
+        VALUES ('delete', old.id, old.client_code, old.name);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF client_code, name ON fees_producerclient BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, client_code, name)
+        VALUES ('delete', old.id, old.client_code, old.name);
+        INSERT INTO {FTS_TABLE}(rowid, client_code, name) VALUES (new.id, new.client_code, new.name);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def create_search_index(apps, schema_editor):
+    # the trigram index needs SQLite 3.34+; without it client search falls back to LIKE queries
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(CREATE_STATEMENTS[0])
+        except OperationalError:
+            return
+        for statement in CREATE_STATEMENTS[1:]:
+            cursor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for trigger in ('insert', 'delete', 'update'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fees', '0016_agent_statements'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
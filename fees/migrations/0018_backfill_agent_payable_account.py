@@ -0,0 +1,35 @@
+# Generated by Django 5.2a1 on 2026-10-18 14:30
+
+from django.conf import settings
+from django.db import migrations
+
+
+def assign_default_payable_account(apps, schema_editor):
+    # mirrors fees.services.fee_ledger.default_payable_account with the historical models
+    Agent = apps.get_model('fees', 'Agent')
+    Account = apps.get_model('accounting', 'Account')
+    AccountSubtype = apps.get_model('accounting', 'AccountSubtype')
+    AccountType = apps.get_model('accounting', 'AccountType')
+    if not Agent.objects.filter(payable_account__isnull=True).exists():
+        return
+    account = Account.objects.filter(account_code=settings.AGENT_PAYABLE_ACCOUNT_CODE).first()
+    if account is None:
+        account_type, _ = AccountType.objects.get_or_create(account_type_code='LIAB', defaults={'name': 'Liability'})
+        subtype, _ = AccountSubtype.objects.get_or_create(
+            account_type=account_type, account_subtype_code='AGTPAY', defaults={'name': 'Agents Payable'})
+        account = Account.objects.create(
+            account_code=settings.AGENT_PAYABLE_ACCOUNT_CODE, account_subtype=subtype, name='Agents Payable',
+            status='A')
+    Agent.objects.filter(payable_account__isnull=True).update(payable_account=account)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0003_account_balances'),
+        ('fees', '0017_producerclient_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_default_payable_account, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2a1 on 2026-10-18 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fees', '0018_backfill_agent_payable_account'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deal',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='dealsplit',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
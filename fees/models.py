@@ -1,7 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from accounting.models import Account, CommissionPeriod
-from django.db.models import Sum
+from django.db.models import FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 
 
@@ -26,6 +27,8 @@ class Agent(models.Model):
     payment_account_number = models.CharField(max_length=16, null=True, blank=True)
     is_gst_exempt = models.BooleanField(default=False)
     is_external = models.BooleanField(default=False)
+    # ledger account credited with the agent's fees when journals are committed
+    payable_account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='payable_agents', null=True, blank=True)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -37,6 +40,8 @@ class Deal(models.Model):
     code = models.CharField(max_length=5, unique=True)
     name = models.CharField(max_length=100)
     agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='deals')
+    # with DealSplit.updated_at, tells SplitRuleIndex when its compiled rules for the deal are stale
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.code} - {self.name}"
@@ -54,6 +59,7 @@ class DealSplit(models.Model):
     producer_filter = models.ForeignKey('Producer', on_delete=models.CASCADE, null=True, blank=True)
     bkge_class_filter = models.ForeignKey('BkgeClass', on_delete=models.CASCADE, null=True, blank=True)
     percentage = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
 
 
 class Producer(models.Model):
@@ -100,7 +106,10 @@ class Journal(models.Model):
     producer = models.ForeignKey(Producer, on_delete=models.CASCADE)
     committed_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=1)
-    pass
+    # amount + gst over the journal's details, kept current by update_credit_totals
+    credit_total = models.FloatField(default=0.0)
+    # summarized ledger journal posted for the fees when the journal is committed
+    ledger_journal = models.ForeignKey('accounting.Journal', on_delete=models.SET_NULL, related_name='fee_journals', null=True, blank=True)
 
     def __str__(self):
         return f"{self.period_end_date} - {self.reference} - {self.description}"
@@ -108,6 +117,19 @@ class Journal(models.Model):
     def total_credits(self):
         return self.details.all().aggregate(total=(Sum('amount')+Sum('gst')))['total']  or 0
 
+    @classmethod
+    def update_credit_totals(cls, journal_ids):
+        """Recomputes credit_total for the given journals from their details in a single UPDATE."""
+        totals = (
+            JournalDetail.objects.filter(journal=OuterRef('pk'))
+            .values('journal')
+            .annotate(total=Sum('amount') + Sum('gst'))
+            .values('total')
+        )
+        cls.objects.filter(pk__in=journal_ids).update(
+            credit_total=Coalesce(Subquery(totals, output_field=FloatField()), Value(0.0))
+        )
+
     def get_absolute_url(self):
         return reverse('fees:journal-detail', args=[str(self.id)])
 
@@ -121,8 +143,44 @@ class Journal(models.Model):
         ).distinct()
 
 
+class JournalJob(models.Model):
+    """
+    A queued upload or commit for a journal, run outside the request by the process_journal_jobs command.
+    Progress counters are updated as the job runs so the journal detail page can poll them.
+    """
+    UPLOAD = 'UPLOAD'
+    COMMIT = 'COMMIT'
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+    journal = models.ForeignKey(Journal, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=10)
+    status = models.CharField(max_length=10, default=QUEUED)
+    file = models.FileField(upload_to='journal_uploads/', null=True, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='journal_jobs')
+    attempts = models.IntegerField(default=0)
+    rows_parsed = models.IntegerField(default=0)
+    details_inserted = models.IntegerField(default=0)
+    rows_dropped = models.IntegerField(default=0)
+    fees_generated = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} for journal {self.journal_id} ({self.status})"
+
+    def is_active(self):
+        return self.status in (self.QUEUED, self.RUNNING)
+
+
 class JournalDetail(models.Model):
     journal = models.ForeignKey(Journal, on_delete=models.CASCADE, related_name='details')
+    upload_job = models.ForeignKey(JournalJob, on_delete=models.SET_NULL, related_name='details', null=True, blank=True)
     client_account = models.ForeignKey(ProducerClient, on_delete=models.CASCADE, related_name='journal_details')
     related_charge = models.ForeignKey('charges.Charge', on_delete=models.SET_NULL, related_name='related_journal_details', null=True, blank=True)
     bkge_class = models.ForeignKey('fees.BkgeClass', on_delete=models.CASCADE)
@@ -139,6 +197,12 @@ class JournalDetail(models.Model):
     def splits(self):
         return self.client_account.deal.splits.all()
 
+    def delete(self, *args, **kwargs):
+        # bulk deletes through a queryset must call Journal.update_credit_totals themselves
+        result = super().delete(*args, **kwargs)
+        Journal.update_credit_totals([self.journal_id])
+        return result
+
 
 class Fee(models.Model):
     agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='fees')
@@ -147,4 +211,41 @@ class Fee(models.Model):
     gst = models.FloatField()
 
     def __str__(self):
-        return f"Fee: {self.amount} of {self.detail.amount} for {self.agent}"
\ No newline at end of file
+        return f"Fee: {self.amount} of {self.detail.amount} for {self.agent}"
+
+class AgentStatementSummary(models.Model):
+    """An agent's fee totals for a closed period by producer and bkge class, written when the period is closed."""
+    period = models.ForeignKey(CommissionPeriod, on_delete=models.CASCADE, related_name='statement_summaries')
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='statement_summaries')
+    producer = models.ForeignKey(Producer, on_delete=models.CASCADE)
+    bkge_class = models.ForeignKey(BkgeClass, on_delete=models.CASCADE)
+    total_amount = models.FloatField()
+    total_gst = models.FloatField()
+    fee_count = models.IntegerField()
+
+    class Meta:
+        unique_together = ('period', 'agent', 'producer', 'bkge_class')
+
+    def __str__(self):
+        return f"{self.agent} {self.period}: {self.producer.code} {self.bkge_class.code} {self.total_amount}"
+
+
+class AgentStatementLine(models.Model):
+    """One fee on an agent's statement for a closed period, copied with the client and journal details it shows."""
+    period = models.ForeignKey(CommissionPeriod, on_delete=models.CASCADE, related_name='statement_lines')
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='statement_lines')
+    fee = models.ForeignKey(Fee, on_delete=models.CASCADE, related_name='statement_lines')
+    producer = models.ForeignKey(Producer, on_delete=models.CASCADE)
+    bkge_class = models.ForeignKey(BkgeClass, on_delete=models.CASCADE)
+    journal_reference = models.CharField(max_length=50)
+    client_code = models.CharField(max_length=50)
+    client_name = models.CharField(max_length=100)
+    details = models.CharField(max_length=100)
+    amount = models.FloatField()
+    gst = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=['period', 'agent'])]
+
+    def __str__(self):
+        return f"{self.agent} {self.period}: {self.client_code} {self.amount}"
@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from django.db.models import QuerySet
+
+
+@dataclass
+class KeysetPage:
+    """A page of rows in key order, with the keys to request the pages either side of it (None at either end)."""
+    rows: list
+    next_after: Optional[int] = None
+    previous_before: Optional[int] = None
+
+
+def _key_of(row, key):
+    return row[key] if isinstance(row, dict) else getattr(row, key)
+
+
+def keyset_page(queryset: QuerySet, per_page: int, after=None, before=None, key='id') -> KeysetPage:
+    """
+    Returns the per_page rows of queryset that follow key after (or precede key before), seeking on the key's index
+    rather than counting past an OFFSET, so every page costs the same however deep it is. queryset may yield model
+    instances or values() dicts, as long as key is among their fields.
+    """
+    if before is not None:
+        rows = list(queryset.filter(**{f'{key}__lt': before}).order_by(f'-{key}')[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return KeysetPage(
+            rows,
+            next_after=_key_of(rows[-1], key) if rows else None,
+            previous_before=_key_of(rows[0], key) if has_previous else None,
+        )
+
+    if after is not None:
+        queryset = queryset.filter(**{f'{key}__gt': after})
+    rows = list(queryset.order_by(key)[:per_page + 1])
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    return KeysetPage(
+        rows,
+        next_after=_key_of(rows[-1], key) if has_next else None,
+        previous_before=_key_of(rows[0], key) if after is not None and rows else None,
+    )
+
+
+def keyset_params(query_dict) -> dict:
+    """Reads the after and before keys from request.GET, ignoring values that are not whole numbers."""
+    params = {}
+    for name in ('after', 'before'):
+        try:
+            params[name] = int(query_dict[name])
+        except (KeyError, ValueError):
+            pass
+    return params
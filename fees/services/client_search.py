@@ -0,0 +1,44 @@
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from fees.models import ProducerClient
+from fees.pagination import KeysetPage, keyset_page
+
+# trigram index over client_code and name, created by migration 0017 where SQLite supports it
+FTS_TABLE = 'fees_producerclient_fts'
+# the trigram tokenizer only indexes terms of at least three characters
+MIN_FTS_LENGTH = 3
+RESULT_FIELDS = ('id', 'client_code', 'name', 'producer_id', 'producer__code', 'deal_id', 'deal__code')
+
+
+@lru_cache(maxsize=1)
+def has_search_index() -> bool:
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def search_clients(query='', producer=None, deal=None, unallocated=False, per_page=50, after=None,
+                   before=None) -> KeysetPage:
+    """
+    Returns a keyset page of clients, as dicts of RESULT_FIELDS in id order, whose client code or name contains
+    query, optionally limited to a producer, a deal or clients without a deal. Searches of three or more characters
+    go through the trigram index; shorter ones match client codes and names that start with query.
+    """
+    clients = ProducerClient.objects.all()
+    query = query.strip()
+    if len(query) >= MIN_FTS_LENGTH and has_search_index():
+        phrase = '"' + query.replace('"', '""') + '"'
+        clients = clients.filter(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [phrase]))
+    elif len(query) >= MIN_FTS_LENGTH:
+        clients = clients.filter(Q(client_code__icontains=query) | Q(name__icontains=query))
+    elif query:
+        clients = clients.filter(Q(client_code__istartswith=query) | Q(name__istartswith=query))
+    if producer is not None:
+        clients = clients.filter(producer=producer)
+    if deal is not None:
+        clients = clients.filter(deal=deal)
+    elif unallocated:
+        clients = clients.filter(deal__isnull=True)
+    return keyset_page(clients.values(*RESULT_FIELDS), per_page, after=after, before=before)
@@ -0,0 +1,115 @@
+"""
+Streaming exports of journal details, fees and agent statements.
+
+Rows are read with values_list and QuerySet.iterator so only one chunk is held in memory. CSV is written a row at a
+time straight into the response. XLSX goes through a write-only openpyxl workbook, which spools rows to disk as they
+are appended; the finished file is then streamed from a temporary file, since an xlsx zip can only be finalized once
+every row is known.
+"""
+
+import csv
+import tempfile
+from dataclasses import dataclass
+
+from django.db.models import QuerySet
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+@dataclass(frozen=True)
+class ExportColumns:
+    """Header and values_list field for each exported column, in order."""
+    columns: tuple
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    @property
+    def fields(self):
+        return [field for _, field in self.columns]
+
+
+JOURNAL_DETAIL_COLUMNS = ExportColumns((
+    ('Client Code', 'client_account__client_code'),
+    ('Client Name', 'client_account__name'),
+    ('Bkge Class', 'bkge_class__code'),
+    ('Product', 'product'),
+    ('External Adviser', 'external_adviser'),
+    ('Amount', 'amount'),
+    ('GST', 'gst'),
+    ('Details', 'details'),
+    ('Lender Amount', 'lender_amount'),
+    ('Lender GST', 'lender_gst'),
+    ('Balance', 'balance'),
+    ('Limit', 'limit'),
+))
+
+FEE_COLUMNS = ExportColumns((
+    ('Journal', 'detail__journal__reference'),
+    ('Producer', 'detail__journal__producer__code'),
+    ('Agent', 'agent__agent_code'),
+    ('Client Code', 'detail__client_account__client_code'),
+    ('Client Name', 'detail__client_account__name'),
+    ('Bkge Class', 'detail__bkge_class__code'),
+    ('Amount', 'amount'),
+    ('GST', 'gst'),
+))
+
+STATEMENT_COLUMNS = ExportColumns((
+    ('Journal', 'journal_reference'),
+    ('Producer', 'producer__code'),
+    ('Client Code', 'client_code'),
+    ('Client Name', 'client_name'),
+    ('Bkge Class', 'bkge_class__code'),
+    ('Details', 'details'),
+    ('Amount', 'amount'),
+    ('GST', 'gst'),
+))
+
+
+class _Echo:
+    """A file-like object whose write returns the value, so csv.writer yields each row instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset: QuerySet, columns: ExportColumns, chunk_size=CHUNK_SIZE):
+    return queryset.values_list(*columns.fields).iterator(chunk_size=chunk_size)
+
+
+def iter_csv(queryset: QuerySet, columns: ExportColumns, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns.headers)
+    for row in iter_rows(queryset, columns, chunk_size):
+        yield writer.writerow(row)
+
+
+def write_xlsx(queryset: QuerySet, columns: ExportColumns, file, chunk_size=CHUNK_SIZE, sheet_title='Export'):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+    sheet.append(columns.headers)
+    for row in iter_rows(queryset, columns, chunk_size):
+        sheet.append(row)
+    workbook.save(file)
+
+
+def export_response(queryset: QuerySet, columns: ExportColumns, file_format: str, filename: str):
+    """Returns a streaming CSV or XLSX response of queryset. Raises ValueError for any other file_format."""
+    if file_format not in CONTENT_TYPES:
+        raise ValueError(f"Unknown export format {file_format}.")
+    if file_format == 'csv':
+        response = StreamingHttpResponse(iter_csv(queryset, columns), content_type=CONTENT_TYPES['csv'])
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        return response
+    file = tempfile.TemporaryFile()
+    write_xlsx(queryset, columns, file)
+    file.seek(0)
+    return FileResponse(file, as_attachment=True, filename=f'{filename}.xlsx', content_type=CONTENT_TYPES['xlsx'])
@@ -0,0 +1,63 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+import pandas as pd
+from django.conf import settings
+
+from accounting.models import Account, AccountSubtype, AccountType, Journal as LedgerJournalModel
+from accounting.services.ledger_posting import CENT, LedgerJournal, post_journals
+from fees.models import Agent, BkgeClass, Journal
+
+
+def default_payable_account() -> Account:
+    """
+    Returns the shared agents payable account (settings.AGENT_PAYABLE_ACCOUNT_CODE), creating it and its liability
+    type and subtype if needed. Migration 0018 assigned it to every agent that had no payable account.
+    """
+    account = Account.objects.filter(account_code=settings.AGENT_PAYABLE_ACCOUNT_CODE).first()
+    if account is None:
+        account_type, _ = AccountType.objects.get_or_create(account_type_code='LIAB', defaults={'name': 'Liability'})
+        subtype, _ = AccountSubtype.objects.get_or_create(
+            account_type=account_type, account_subtype_code='AGTPAY', defaults={'name': 'Agents Payable'})
+        account = Account.objects.create(
+            account_code=settings.AGENT_PAYABLE_ACCOUNT_CODE, account_subtype=subtype, name='Agents Payable',
+            status='A')
+    return account
+
+
+def post_fee_ledger_journal(journal: Journal, fee_totals: pd.DataFrame) -> LedgerJournalModel | None:
+    """
+    Posts one summarized ledger journal for a committed journal's fees: a credit to each agent's payable account per
+    bkge class, balanced by a single debit to the journal's cash account. Agents without a payable account are
+    credited to the shared default_payable_account, with their agent code in the line description. fee_totals holds
+    agent_id, bkge_class_id and total (amount + gst) per group, e.g. from BatchFeeGenerator.fee_totals. Returns None
+    when there are no fees.
+    """
+    if fee_totals.empty:
+        return None
+    agents = Agent.objects.in_bulk(fee_totals['agent_id'].unique().tolist())
+    fallback_account_id = None
+    if any(agent.payable_account_id is None for agent in agents.values()):
+        fallback_account_id = default_payable_account().id
+    bkge_codes = dict(BkgeClass.objects.filter(id__in=fee_totals['bkge_class_id'].unique().tolist())
+                      .values_list('id', 'code'))
+
+    lines = []
+    for agent_id, bkge_class_id, total in fee_totals[['agent_id', 'bkge_class_id', 'total']].itertuples(
+            index=False, name=None):
+        amount = Decimal(total).quantize(CENT, rounding=ROUND_HALF_UP)
+        if amount:
+            agent = agents[agent_id]
+            lines.append((agent.payable_account_id or fallback_account_id, -amount,
+                          f"{agent.agent_code} {bkge_codes[bkge_class_id]} fees"))
+    if not lines:
+        return None
+    # the cash debit is the sum of the rounded credits, so the journal balances to the cent
+    lines.insert(0, (journal.cash_account_id, -sum(line[1] for line in lines), f"Fees for {journal.reference}"))
+
+    ledger_journal = LedgerJournal(
+        description=f"Fees: {journal.description}"[:100],
+        reference=f"FEES-{journal.id} {journal.reference}"[:100],
+        period_end_date=journal.period_end_date,
+        lines=lines,
+    )
+    return post_journals([ledger_journal])[0]
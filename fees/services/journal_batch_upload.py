@@ -0,0 +1,92 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from dataclasses import dataclass
+
+import pandas as pd
+
+from files.file_parsing import DEFAULT_CHUNK_SIZE
+from files.parse_cache import ParseCache
+from files.producer_dispatcher import ProducerCleanerRegistry
+from fees.models import Journal, JournalJob
+from fees.services.journal_jobs import enqueue_upload, heartbeat, run_job
+
+
+@dataclass
+class BatchUploadResult:
+    """Outcome of queueing one (journal, file) pair of a batch upload."""
+    journal: Journal
+    file_name: str
+    job: JournalJob = None
+    error: str = ''
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+
+def enqueue_upload_batch(items: list[tuple[Journal, object]], user) -> list[BatchUploadResult]:
+    """
+    Queues an upload job for each (journal, file) pair. The job runner picks queued uploads up together and parses
+    them with run_upload_batch. Returns one result per pair, in the order given; a pair that cannot be queued (the
+    journal is closed or already has a job) is reported and doesn't affect the others.
+    """
+    results = []
+    for journal, file in items:
+        result = BatchUploadResult(journal=journal, file_name=getattr(file, 'name', str(file)))
+        try:
+            result.job = enqueue_upload(journal, file, user)
+        except ValueError as e:
+            result.error = str(e)
+        results.append(result)
+    return results
+
+
+def run_upload_batch(jobs: list[JournalJob], chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None):
+    """
+    Runs claimed upload jobs, parsing their files concurrently on a process pool first so the total time approaches
+    that of the slowest file. Each job then inserts its details from the parse cache, chunk by chunk as usual.
+    """
+    if len(jobs) == 1:
+        run_job(jobs[0], chunk_size)
+        return
+    # every job keeps its heartbeat while it waits for the parses and for the jobs ahead of it
+    with ExitStack() as stack:
+        for job in jobs:
+            stack.enter_context(heartbeat(job))
+        parse_uploads(jobs, max_workers)
+        for job in jobs:
+            run_job(job, chunk_size)
+
+
+def parse_uploads(jobs: list[JournalJob], max_workers=None):
+    """
+    Parses the jobs' files that are not already in the parse cache on a process pool and caches the results.
+    Every parse is submitted before any result is handled. A file that fails to parse is skipped; its job parses it
+    again and fails with the error.
+    """
+    cache = ParseCache.from_settings()
+    pending = {}
+    with ProcessPoolExecutor(max_workers=max_workers or min(len(jobs), os.cpu_count() or 1) or 1) as pool:
+        for job in jobs:
+            producer = job.journal.producer.code
+            with job.file.open('rb') as file:
+                key = cache.key(producer, file)
+                if key in cache:
+                    continue
+                future = pool.submit(_parse_file, producer, file.read())
+            pending[future] = key
+
+        for future in as_completed(pending):
+            try:
+                df = future.result()
+            except Exception:
+                continue
+            cache.put(pending[future], df)
+
+
+def _parse_file(producer: str, content: bytes) -> pd.DataFrame:
+    # importing the producer parsers registers them in worker processes that were spawned rather than forked
+    from files import file_manager
+    return ProducerCleanerRegistry.clean(producer, io.BytesIO(content))
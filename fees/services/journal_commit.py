@@ -1,7 +1,41 @@
 
+from django.db import transaction
 from django.db.models import QuerySet
-from fees.models import Journal, JournalDetail, BkgeClass, Deal, DealSplit, Producer, Agent, Fee
+from accounting.models import CommissionPeriod
+from fees.models import Journal, JournalDetail, JournalJob, BkgeClass, Deal, DealSplit, Producer, Agent, Fee
+from fees.services.fee_ledger import post_fee_ledger_journal
+from fees.services.split_rules import SplitRuleIndex
 from typing import Optional
+import pandas as pd
+
+
+def commit_journal(journal: Journal) -> int:
+    """
+    Generates and saves the fees for an open journal, posts their summarized ledger journal, assigns it to the
+    open commission period and closes it. Returns the number of fees created. Raises ValueError if the journal cannot be committed.
+    The journal is claimed with a conditional UPDATE inside the transaction, so of two concurrent commits of the same
+    journal only one writes fees; the other waits for it and then finds the journal already closed. A journal with a
+    queued or running upload job is refused, since the upload would keep adding details after the fees are written.
+    """
+    if journal.status != 'OPEN':
+        raise ValueError(f"Journal {journal.id} is not open.")
+    if journal.get_accounts_with_null_deal().exists():
+        raise ValueError(f"Journal {journal.id} has client accounts that are not allocated to a deal.")
+    with transaction.atomic():
+        if not Journal.objects.filter(id=journal.id, status='OPEN').update(status='CLOSED'):
+            raise ValueError(f"Journal {journal.id} is not open.")
+        if journal.jobs.filter(kind=JournalJob.UPLOAD, status__in=[JournalJob.QUEUED, JournalJob.RUNNING]).exists():
+            raise ValueError(f"Journal {journal.id} has an upload in progress.")
+        # a closed period's balances and agent statements are final, so late commits go to the next open period
+        journal.commission_period = CommissionPeriod.get_open_period()
+        fee_generator = BatchFeeGenerator()
+        fee_generator.get_journal_details(journal)
+        fee_generator.generate_fees()
+        Fee.objects.bulk_create(fee_generator.fees, batch_size=1000)
+        journal.ledger_journal = post_fee_ledger_journal(journal, fee_generator.fee_totals())
+        journal.status = 'CLOSED'
+        journal.save()
+    return len(fee_generator.fees)
 
 
 class FeeGenerator:
@@ -95,5 +129,80 @@ class _JournalDetailFilter:
         return filtered_splits
 
 
+class BatchFeeGenerator:
+    """
+    Vectorised replacement for FeeGenerator. Loads a journal's details into a DataFrame, resolves the split rules
+    for each distinct (deal, producer, bkge_class) combination from the SplitRuleIndex, joins them back onto the
+    details and computes every Fee in a single pass. Produces the same fees as JournalDetailSplitter, including the
+    remainder-to-primary-agent rule.
+    """
 
+    DETAIL_FIELDS = ['id', 'amount', 'gst', 'bkge_class_id', 'deal_id', 'producer_id']
+    RULE_KEY = ['deal_id', 'producer_id', 'bkge_class_id']
+
+    def __init__(self):
+        self.details: pd.DataFrame = None
+        self.fee_rows: pd.DataFrame = None
+        self.fees: list[Fee] = []
+
+    def get_journal_details(self, journal: Journal) -> pd.DataFrame:
+        qs = (
+            JournalDetail
+            .objects
+            .filter(journal_id=journal.id)
+            .order_by('id')
+            .values_list('id', 'amount', 'gst', 'bkge_class_id', 'client_account__deal_id', 'journal__producer_id')
+        )
+        self.details = pd.DataFrame.from_records(list(qs), columns=self.DETAIL_FIELDS)
+        return self.details
+
+    def get_split_rules(self, keys: pd.DataFrame) -> pd.DataFrame:
+        # deals may have changed in another process since the index last saw them
+        SplitRuleIndex.refresh(keys['deal_id'].unique().tolist())
+        rules = [
+            (*key, agent_id, percentage, order)
+            for key in keys.itertuples(index=False, name=None)
+            for order, (agent_id, percentage) in enumerate(SplitRuleIndex.get_rules(*key))
+        ]
+        return pd.DataFrame.from_records(rules, columns=self.RULE_KEY + ['agent_id', 'percentage', '_order'])
 
+    def generate_fees(self) -> list[Fee]:
+        details = self.details
+        self.fees = []
+        if details is None or details.empty:
+            return self.fees
+        if details['deal_id'].isna().any():
+            raise ValueError('Journal contains client accounts that are not allocated to a deal.')
+
+        details = details.astype({'deal_id': 'int64'})
+        rules = self.get_split_rules(details[self.RULE_KEY].drop_duplicates())
+
+        # one fee row per detail per applicable rule, in the same order the per-row splitter creates them
+        fee_rows = (
+            details
+            .merge(rules, on=self.RULE_KEY, how='inner', sort=False)
+            .sort_values(['id', '_order'], kind='stable')
+        )
+        percentage = fee_rows['percentage'].to_numpy(dtype=float)
+        amounts = fee_rows['amount'].to_numpy(dtype=float) * percentage / 100
+        gsts = fee_rows['gst'].to_numpy(dtype=float) * percentage / 100
+        self.fee_rows = fee_rows[['agent_id', 'bkge_class_id']].assign(fee_amount=amounts, fee_gst=gsts)
+
+        self.fees = [
+            Fee(agent_id=agent_id, detail_id=detail_id, amount=amount, gst=gst)
+            for detail_id, agent_id, amount, gst in zip(
+                fee_rows['id'].tolist(), fee_rows['agent_id'].tolist(), amounts.tolist(), gsts.tolist()
+            )
+        ]
+        return self.fees
+
+    def fee_totals(self) -> pd.DataFrame:
+        """The generated fees (amount + gst) summed per agent and bkge class."""
+        if self.fee_rows is None or self.fee_rows.empty:
+            return pd.DataFrame(columns=['agent_id', 'bkge_class_id', 'total'])
+        return (
+            self.fee_rows
+            .assign(total=self.fee_rows['fee_amount'] + self.fee_rows['fee_gst'])
+            .groupby(['agent_id', 'bkge_class_id'], as_index=False, sort=True)['total']
+            .sum()
+        )
@@ -0,0 +1,159 @@
+import datetime as dt
+import threading
+import traceback
+from contextlib import contextmanager
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils.timezone import now
+
+from fees.models import Journal, JournalDetail, JournalJob, Fee
+from fees.services.journal_commit import commit_journal
+from fees.services.journal_upload import iter_upload_chunks, lock_open_journal
+from files.file_parsing import DEFAULT_CHUNK_SIZE
+
+MAX_ATTEMPTS = 3
+# seconds between heartbeats while a commit runs; well inside process_journal_jobs' default --stale-after
+HEARTBEAT_INTERVAL = 30
+
+
+ACTIVE_STATUSES = (JournalJob.QUEUED, JournalJob.RUNNING)
+
+
+def enqueue_upload(journal: Journal, file, user) -> JournalJob:
+    return _enqueue(journal, JournalJob.UPLOAD, user, file=file)
+
+
+def enqueue_commit(journal: Journal, user) -> JournalJob:
+    return _enqueue(journal, JournalJob.COMMIT, user)
+
+
+def _enqueue(journal: Journal, kind, user, **fields) -> JournalJob:
+    """Queues a job, raising ValueError if the journal is not open or already has a queued or running job."""
+    with transaction.atomic():
+        lock_open_journal(journal.id)
+        if journal.jobs.filter(status__in=ACTIVE_STATUSES).exists():
+            raise ValueError(f"Journal {journal.id} already has a job in progress.")
+        return JournalJob.objects.create(journal=journal, kind=kind, created_by=user, **fields)
+
+
+def claim_next_job(kind=None) -> JournalJob | None:
+    """
+    Atomically moves the oldest queued job (of kind, if given) to RUNNING and returns it, skipping jobs whose journal
+    already has a running job. The conditional update means two workers can never claim the same job, and locking
+    the journal's row first means they can never start two jobs on one journal.
+    """
+    running = JournalJob.objects.filter(journal=OuterRef('journal'), status=JournalJob.RUNNING)
+    candidates = JournalJob.objects.filter(~Exists(running), status=JournalJob.QUEUED)
+    if kind is not None:
+        candidates = candidates.filter(kind=kind)
+    candidates = (
+        candidates
+        .order_by('id')
+        .values_list('id', 'journal_id')
+    )
+    for job_id, journal_id in candidates[:10]:
+        timestamp = now()
+        with transaction.atomic():
+            list(Journal.objects.select_for_update().filter(id=journal_id).values_list('id'))
+            claimed = JournalJob.objects.filter(~Exists(running), id=job_id, status=JournalJob.QUEUED).update(
+                status=JournalJob.RUNNING, attempts=F('attempts') + 1, started_at=timestamp, heartbeat_at=timestamp
+            )
+        if claimed:
+            return JournalJob.objects.select_related('journal__producer', 'created_by').get(id=job_id)
+    return None
+
+
+def requeue_stale_jobs(stale_after: dt.timedelta) -> int:
+    """
+    Jobs left RUNNING by a worker that crashed stop sending heartbeats. They are queued again, or failed once
+    they have used up their attempts.
+    """
+    cutoff = now() - stale_after
+    stale = JournalJob.objects.filter(status=JournalJob.RUNNING, heartbeat_at__lt=cutoff)
+    stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=JournalJob.FAILED, error='Worker stopped responding.', finished_at=now()
+    )
+    return stale.filter(attempts__lt=MAX_ATTEMPTS).update(status=JournalJob.QUEUED)
+
+
+def run_job(job: JournalJob, chunk_size=DEFAULT_CHUNK_SIZE):
+    try:
+        if job.kind == JournalJob.UPLOAD:
+            _run_upload(job, chunk_size)
+        elif job.kind == JournalJob.COMMIT:
+            _run_commit(job)
+        else:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+    except Exception:
+        _update(job, status=JournalJob.FAILED, error=traceback.format_exc(), finished_at=now())
+        return
+    _update(job, status=JournalJob.DONE, error='', finished_at=now())
+    if job.file:
+        job.file.delete(save=False)
+
+
+def _run_upload(job: JournalJob, chunk_size):
+    # a retried job starts again from a clean slate: remove anything inserted by the previous attempt, unless the
+    # journal has been committed since
+    with transaction.atomic():
+        lock_open_journal(job.journal_id)
+        JournalDetail.objects.filter(upload_job=job).delete()
+        Journal.update_credit_totals([job.journal_id])
+        _update(job, rows_parsed=0, details_inserted=0, rows_dropped=0)
+
+    with job.file.open('rb') as file:
+        for rows, summary in iter_upload_chunks(file, job.journal, job.created_by, chunk_size, upload_job_id=job.id):
+            _update(
+                job,
+                rows_parsed=F('rows_parsed') + rows,
+                details_inserted=F('details_inserted') + summary.inserted,
+                rows_dropped=F('rows_dropped') + summary.total_dropped,
+            )
+
+
+def _run_commit(job: JournalJob):
+    journal = job.journal
+    journal.refresh_from_db(fields=['status'])
+    # a previous attempt, or a commit from the journal page, may already have committed the journal
+    if journal.status != 'CLOSED':
+        try:
+            with heartbeat(job):
+                commit_journal(journal)
+        except ValueError:
+            journal.refresh_from_db(fields=['status'])
+            if journal.status != 'CLOSED':
+                raise
+    _update(job, fees_generated=Fee.objects.filter(detail__journal=journal).count())
+
+
+@contextmanager
+def heartbeat(job: JournalJob, interval=HEARTBEAT_INTERVAL):
+    """
+    Keeps job's heartbeat current from a separate thread, and so a separate connection, while the body runs, so
+    requeue_stale_jobs does not take a long commit or a batch of uploads for a dead worker. A heartbeat that cannot
+    get a write lock (SQLite allows one writer) is skipped.
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    _update(job)
+                except DatabaseError:
+                    pass
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _update(job: JournalJob, **fields):
+    JournalJob.objects.filter(id=job.id).update(heartbeat_at=now(), **fields)
@@ -1,57 +1,225 @@
-from ..models import ProducerClient, JournalDetail, BkgeClass, Producer
-import pandas as pd
-
-def add_missing_accounts(df, journal, user):
-    accounts = df.account_code.unique().tolist()
-    accounts_not_in_db = check_unallocated_accounts(accounts, journal.producer)
-    missing_df = df[df.account_code.isin(accounts_not_in_db)]
-    missing_accounts = missing_df[['account_code', 'name']].drop_duplicates()
-
-    for account_code, name in missing_accounts.itertuples(index=False):
-        ProducerClient.objects.create(
-            producer=journal.producer,
-            client_code=account_code,
-            name=name,
-            deal=None,
-            created_by=user,
-            updated_by=user
+import re
+from dataclasses import dataclass, field
+from django.db import transaction
+from files.parse_cache import cached_clean_chunks
+from files.file_parsing import DEFAULT_CHUNK_SIZE
+from ..models import ProducerClient, Journal, JournalDetail, BkgeClass, Producer
+
+ACCOUNT_LOOKUP_CHUNK_SIZE = 500
+# ParsePipeline.clean_accounts used to strip r'.0' (any character followed by a zero) instead of a trailing '.0', so
+# clients created before that fix may be stored under a mangled code, e.g. '10000' as '0'
+LEGACY_ACCOUNT_CODE_PATTERN = re.compile(r'.0')
+
+
+def legacy_account_code(account_code: str) -> str:
+    """The code the old clean_accounts would have stored for account_code."""
+    return LEGACY_ACCOUNT_CODE_PATTERN.sub('', account_code)
+
+
+def reconcile_accounts(df, journal, user) -> dict[str, int]:
+    """
+    Resolves every account code in df to a ProducerClient id for the journal's producer in one keyed pass:
+    existing clients are looked up with chunked IN lists, missing ones are bulk created (unallocated) and only their
+    ids are fetched back. The returned client_code -> id map is complete for df and is used for detail creation.
+    """
+    codes = df.account_code.astype(str)
+    account_map = lookup_accounts(codes.unique().tolist(), journal.producer_id)
+
+    missing_accounts = (
+        df.assign(account_code=codes)
+        .loc[~codes.isin(account_map.keys()), ['account_code', 'name']]
+        .drop_duplicates(subset='account_code')
+    )
+    if not missing_accounts.empty:
+        ProducerClient.objects.bulk_create(
+            [
+                ProducerClient(
+                    producer_id=journal.producer_id,
+                    client_code=account_code,
+                    name=name,
+                    created_by=user,
+                    updated_by=user
+                )
+                for account_code, name in missing_accounts.itertuples(index=False)
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        account_map.update(lookup_accounts(missing_accounts.account_code.tolist(), journal.producer_id))
+    return account_map
+
+
+def legacy_deal_candidates(clients) -> list[tuple[ProducerClient, ProducerClient]]:
+    """
+    Pairs each unallocated client in clients with the allocated client of the same producer stored under its
+    legacy_account_code, if there is one. Such a pair is often one account that the old clean_accounts stored
+    under a mangled code, but the pattern is broad (a new '1012' mangles to an unrelated '12'), so the pairs are
+    shown for an operator to confirm with allocate_legacy_deal rather than applied on upload.
+    """
+    legacy_codes = {}
+    for client in clients:
+        if client.deal_id is None and (legacy := legacy_account_code(client.client_code)) != client.client_code:
+            legacy_codes.setdefault(client.producer_id, {})[client.id] = (client, legacy)
+
+    candidates = []
+    for producer_id, pairs in legacy_codes.items():
+        codes = list({legacy for _, legacy in pairs.values()})
+        allocated = {}
+        for start in range(0, len(codes), ACCOUNT_LOOKUP_CHUNK_SIZE):
+            allocated.update(
+                (candidate.client_code, candidate)
+                for candidate in ProducerClient.objects.select_related('deal').filter(
+                    producer_id=producer_id, deal__isnull=False,
+                    client_code__in=codes[start:start + ACCOUNT_LOOKUP_CHUNK_SIZE],
+                )
+            )
+        candidates += [(client, allocated[legacy]) for client, legacy in pairs.values() if legacy in allocated]
+    return candidates
+
+
+def allocate_legacy_deal(client: ProducerClient, user) -> ProducerClient:
+    """
+    Allocates an unallocated client to the deal of its legacy_deal_candidates match, once an operator has confirmed
+    the two are the same account. Returns the matched client; raises ValueError if there is no match.
+    """
+    matches = legacy_deal_candidates([client])
+    if not matches:
+        raise ValueError(f"Client {client.client_code} has no allocated client under a legacy code.")
+    _, candidate = matches[0]
+    client.deal = candidate.deal
+    client.updated_by = user
+    client.save()
+    return candidate
+
+
+def lookup_accounts(account_list: list, producer_id) -> dict[str, int]:
+    """Returns the client_code -> id map of the producer's clients in account_list, querying in chunks."""
+    account_map = {}
+    for start in range(0, len(account_list), ACCOUNT_LOOKUP_CHUNK_SIZE):
+        account_map.update(
+            ProducerClient
+            .objects
+            .filter(producer_id=producer_id, client_code__in=account_list[start:start + ACCOUNT_LOOKUP_CHUNK_SIZE])
+            .values_list('client_code', 'id')
         )
+    return account_map
+
+
+@dataclass
+class DetailInsertSummary:
+    """Counts of journal detail rows inserted and dropped (by reason) during an upload."""
+    inserted: int = 0
+    dropped: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_dropped(self) -> int:
+        return sum(self.dropped.values())
 
-def create_journal_details(df, journal_id, producer_id):
+    def add(self, other: 'DetailInsertSummary') -> 'DetailInsertSummary':
+        self.inserted += other.inserted
+        for reason, count in other.dropped.items():
+            self.dropped[reason] = self.dropped.get(reason, 0) + count
+        return self
+
+
+DETAIL_COLUMNS = ['bkge_class_id', 'client_account_id', 'product', 'external_adviser', 'amount', 'gst', 'name',
+                  'lender_amount', 'lender_gst', 'balance', 'limit']
+
+
+def create_journal_details(df, journal_id, producer_id, upload_job_id=None, account_map=None) -> DetailInsertSummary:
+    """
+    Inserts a cleaned producer DataFrame as JournalDetail rows. Rows whose bkge code or account code cannot be
+    resolved are dropped with vectorised masks and counted by reason in the returned summary.
+    account_map (client_code -> id, as returned by reconcile_accounts) saves reloading the producer's clients.
+    """
     bkge_map = {x.code: x.id for x in BkgeClass.objects.all()}
-    account_map = {
-        x.client_code: x.id
-        for x in ProducerClient.objects.filter(producer_id=producer_id)
-    }
-
-    df['bkge_class_id'] = df['bkge_code'].map(bkge_map)
-    df['journal_id'] = journal_id
-    df['client_account_id'] = df.account_code.map(account_map)
-    df.fillna({
+    if account_map is None:
+        account_map = dict(ProducerClient.objects.filter(producer_id=producer_id).values_list('client_code', 'id'))
+
+    df = df.assign(
+        bkge_class_id=df['bkge_code'].map(bkge_map),
+        client_account_id=df['account_code'].map(account_map),
+    )
+    missing_bkge_class = df['bkge_class_id'].isna()
+    missing_client_account = df['client_account_id'].isna() & ~missing_bkge_class
+    summary = DetailInsertSummary(dropped={
+        'unknown_bkge_code': int(missing_bkge_class.sum()),
+        'unknown_account_code': int(missing_client_account.sum()),
+    })
+
+    df = df.loc[~(missing_bkge_class | missing_client_account), DETAIL_COLUMNS].fillna({
         'amount': 0, 'gst': 0, 'lender_amount': 0,
         'lender_gst': 0, 'balance': 0, 'limit': 0
-    }, inplace=True)
+    })
+    df = df.astype({'bkge_class_id': 'int64', 'client_account_id': 'int64'}).astype(object)
+    df = df.where(df.notna(), None)
 
     jd_objs = [
         JournalDetail(
-            journal_id=row['journal_id'],
-            bkge_class_id=row['bkge_class_id'],
-            client_account_id=row['client_account_id'],
-            product=row['product'],
-            external_adviser=row['external_adviser'],
-            amount=row['amount'],
-            gst=row['gst'],
-            details=row['name'],
-            lender_amount=row['lender_amount'],
-            lender_gst=row['lender_gst'],
-            balance=row['balance'],
-            limit=row['limit'],
+            journal_id=journal_id,
+            upload_job_id=upload_job_id,
+            bkge_class_id=bkge_class_id,
+            client_account_id=client_account_id,
+            product=product,
+            external_adviser=external_adviser,
+            amount=amount,
+            gst=gst,
+            details=name,
+            lender_amount=lender_amount,
+            lender_gst=lender_gst,
+            balance=balance,
+            limit=limit,
         )
-        for _, row in df.iterrows()
-        if not any(pd.isna(row[f]) for f in ['journal_id', 'bkge_class_id', 'client_account_id'])
+        for (bkge_class_id, client_account_id, product, external_adviser, amount, gst, name,
+             lender_amount, lender_gst, balance, limit) in df.itertuples(index=False, name=None)
     ]
 
     JournalDetail.objects.bulk_create(jd_objs, batch_size=500)
+    Journal.update_credit_totals([journal_id])
+    summary.inserted = len(jd_objs)
+    return summary
+
+
+def upload_journal_stream(file, journal, user, chunk_size=DEFAULT_CHUNK_SIZE) -> DetailInsertSummary:
+    """
+    Parses the producer file in bounded chunks and inserts each chunk's accounts and journal details before reading
+    the next, so peak memory stays flat regardless of file size. The whole upload is one transaction (each chunk is
+    a savepoint within it), so a failed upload leaves nothing behind; on SQLite that holds the write lock for the
+    whole file, so large files should go through the background upload job, which commits chunk by chunk.
+    """
+    summary = DetailInsertSummary()
+    with transaction.atomic():
+        for rows, chunk_summary in iter_upload_chunks(file, journal, user, chunk_size):
+            summary.add(chunk_summary)
+    return summary
+
+
+def iter_upload_chunks(file, journal, user, chunk_size=DEFAULT_CHUNK_SIZE, upload_job_id=None):
+    """
+    Parses and inserts the producer file one chunk at a time, each chunk in its own transaction unless the caller
+    wraps the loop in one. Yields (rows parsed, DetailInsertSummary) after every chunk so callers can report progress.
+    Raises ValueError, keeping the chunks already inserted, if the journal is no longer open when a chunk starts.
+    """
+    for df in cached_clean_chunks(journal.producer.code, file, chunk_size):
+        with transaction.atomic():
+            lock_open_journal(journal.id)
+            account_map = reconcile_accounts(df, journal, user)
+            chunk_summary = create_journal_details(
+                df, journal_id=journal.id, producer_id=journal.producer_id, upload_job_id=upload_job_id,
+                account_map=account_map
+            )
+        yield len(df), chunk_summary
+
+
+def lock_open_journal(journal_id):
+    """
+    Locks the journal's row until the end of the current transaction and raises ValueError unless it is still open.
+    commit_journal claims the journal by updating the same row, so details are never inserted into a journal while
+    it is being committed.
+    """
+    status = Journal.objects.select_for_update().filter(id=journal_id).values_list('status', flat=True).first()
+    if status != 'OPEN':
+        raise ValueError(f"Journal {journal_id} is not open.")
 
 
 def check_unallocated_accounts(account_list: list, producer: Producer):
@@ -63,18 +231,6 @@ def check_unallocated_accounts(account_list: list, producer: Producer):
     If ProducerClient contains accounts: ['100', '101', '102'] under producer "ABC":
     check_unallocated_accounts(['100', '101', '102', '103'], "ABC") returns ['103']
     """
-    # get list from db filtered by account list provided
-    _existing_clients = (
-        ProducerClient
-        .objects
-        .filter(
-            producer=producer,
-            client_code__in=account_list
-        )
-        .all()
-        .values_list('client_code', flat=True)
-    )
-    accounts = [str(i).replace('.0','') for i in account_list]
-    existing = [str(i) for i in _existing_clients]
+    accounts = [str(i).removesuffix('.0') for i in account_list]
+    existing = lookup_accounts(accounts, producer.id)
     return list(set(accounts) - set(existing))
-
@@ -0,0 +1,43 @@
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+
+from accounting.models import CommissionPeriod
+from fees.models import Fee
+
+# bump when the shape of the report rows changes, so cached reports are not reused
+REPORT_VERSION = 1
+GROUP_FIELDS = ('agent', 'producer', 'bkge_class')
+
+
+def period_fee_totals(commission_period: CommissionPeriod, agent=None, producer=None, bkge_class=None) -> list[dict]:
+    """
+    Returns the period's fee totals as rows of agent, producer and bkge_class ids with total_amount, total_gst and
+    fee_count, from one grouped query over Fee, JournalDetail and Journal. Processed periods never change (commits
+    after a close go to the next open period), so their full report is cached and filtered in memory; open periods
+    are filtered in the query.
+    """
+    filters = {
+        field: getattr(value, 'pk', value)
+        for field, value in zip(GROUP_FIELDS, (agent, producer, bkge_class))
+        if value is not None
+    }
+    if not commission_period.processed:
+        return query_fee_totals(commission_period, filters)
+
+    key = f'period_fee_totals:{REPORT_VERSION}:{commission_period.pk}'
+    rows = cache.get(key)
+    if rows is None:
+        rows = query_fee_totals(commission_period)
+        cache.set(key, rows, timeout=None)
+    return [row for row in rows if all(row[field] == value for field, value in filters.items())]
+
+
+def query_fee_totals(commission_period: CommissionPeriod, filters: dict = None) -> list[dict]:
+    """Runs the grouped fee totals query for commission_period, bypassing the cache."""
+    return list(
+        Fee.objects.filter(detail__journal__commission_period=commission_period)
+        .values('agent', producer=F('detail__journal__producer'), bkge_class=F('detail__bkge_class'))
+        .filter(**(filters or {}))
+        .annotate(total_amount=Sum('amount'), total_gst=Sum('gst'), fee_count=Count('id'))
+        .order_by(*GROUP_FIELDS)
+    )
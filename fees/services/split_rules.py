@@ -0,0 +1,108 @@
+from threading import RLock
+from django.db.models import Count, Max
+from fees.models import Deal, DealSplit
+
+RuleKey = tuple[int, int, int]
+DEAL_CHUNK_SIZE = 500
+
+
+class SplitRuleIndex:
+    """
+    Process-wide index of compiled deal split rules, keyed by (deal_id, producer_id, bkge_class_id).
+
+    Each key resolves to a list of (agent_id, percentage) tuples: the DealSplits whose producer/bkge_class filters
+    match, in split order, followed by the leftover share for the deal's primary agent when the splits total less
+    than 100%. Deals are loaded with their splits on first use and kept across commits, along with a stamp of the
+    deal's agent and updated_at and its splits' count and latest updated_at. Once per commit, refresh compares the
+    stamps of the journal's deals with the database in one query and reloads only the deals that changed, so
+    changes made in another process are picked up. Queryset updates don't set auto_now fields, so bulk edits of
+    deals or splits must set updated_at themselves. The signals in fees/signals.py also clear the index when this
+    process saves or deletes a Deal, DealSplit or Agent.
+    """
+    _lock = RLock()
+    _deals: dict[int, tuple[int, list[tuple]]] = {}
+    _stamps: dict[int, tuple] = {}
+    _rules: dict[RuleKey, list[tuple[int, float]]] = {}
+
+    @classmethod
+    def get_rules(cls, deal_id: int, producer_id: int, bkge_class_id: int) -> list[tuple[int, float]]:
+        key = (deal_id, producer_id, bkge_class_id)
+        rules = cls._rules.get(key)
+        if rules is None:
+            with cls._lock:
+                if deal_id not in cls._deals:
+                    cls._load([deal_id], cls._query_stamps([deal_id]))
+                rules = cls._compile(*key)
+                cls._rules[key] = rules
+        return rules
+
+    @classmethod
+    def refresh(cls, deal_ids: list[int]):
+        """Loads the deals in deal_ids that are not loaded yet or have changed since they were loaded."""
+        stamps = cls._query_stamps(deal_ids)
+        with cls._lock:
+            stale = [deal_id for deal_id in deal_ids if cls._stamps.get(deal_id) != stamps.get(deal_id)]
+            if stale:
+                cls._load(stale, stamps)
+
+    @classmethod
+    def invalidate(cls, **kwargs):
+        with cls._lock:
+            cls._deals = {}
+            cls._stamps = {}
+            cls._rules = {}
+
+    @classmethod
+    def _query_stamps(cls, deal_ids: list[int]) -> dict[int, tuple]:
+        stamps = {}
+        for start in range(0, len(deal_ids), DEAL_CHUNK_SIZE):
+            deals = (
+                Deal
+                .objects
+                .filter(id__in=deal_ids[start:start + DEAL_CHUNK_SIZE])
+                .annotate(split_count=Count('splits'), splits_updated_at=Max('splits__updated_at'))
+                .values_list('id', 'agent_id', 'updated_at', 'split_count', 'splits_updated_at')
+            )
+            stamps.update((deal_id, tuple(stamp)) for deal_id, *stamp in deals)
+        return stamps
+
+    @classmethod
+    def _load(cls, deal_ids: list[int], stamps: dict[int, tuple]):
+        # the splits are read after the stamps, so a change in between only makes the next refresh reload the deal
+        deals = {deal_id: (stamps[deal_id][0], []) for deal_id in deal_ids if deal_id in stamps}
+        for start in range(0, len(deal_ids), DEAL_CHUNK_SIZE):
+            splits = (
+                DealSplit
+                .objects
+                .filter(deal_id__in=deal_ids[start:start + DEAL_CHUNK_SIZE])
+                .order_by('deal_id', 'id')
+                .values_list('deal_id', 'agent_id', 'producer_filter_id', 'bkge_class_filter_id', 'percentage')
+            )
+            for deal_id, *split in splits:
+                if deal_id in deals:
+                    deals[deal_id][1].append(tuple(split))
+        for deal_id in deal_ids:
+            cls._deals.pop(deal_id, None)
+            cls._stamps.pop(deal_id, None)
+        cls._deals.update(deals)
+        cls._stamps.update((deal_id, stamps[deal_id]) for deal_id in deals)
+        reloaded = set(deal_ids)
+        cls._rules = {key: rules for key, rules in cls._rules.items() if key[0] not in reloaded}
+
+    @classmethod
+    def _compile(cls, deal_id, producer_id, bkge_class_id) -> list[tuple[int, float]]:
+        if deal_id not in cls._deals:
+            raise KeyError(f"Deal {deal_id} does not exist.")
+        deal_agent_id, splits = cls._deals[deal_id]
+        rules = [
+            (agent_id, percentage)
+            for agent_id, producer_filter_id, bkge_class_filter_id, percentage in splits
+            if (
+                    (producer_filter_id is None or producer_filter_id == producer_id) and
+                    (bkge_class_filter_id is None or bkge_class_filter_id == bkge_class_id)
+            )
+        ]
+        # if the sum of split allocation is less than 100%, assign remainder to the deal's primary agent.
+        if (remaining_percentage := 100 - sum([percentage for _, percentage in rules])) > 0:
+            rules.append((deal_agent_id, remaining_percentage))
+        return rules
@@ -0,0 +1,51 @@
+from django.db import transaction
+
+from accounting.models import CommissionPeriod
+from fees.models import AgentStatementLine, AgentStatementSummary, Fee
+from fees.services.period_reporting import query_fee_totals
+
+LINE_FIELDS = (
+    'id', 'agent_id', 'detail__journal__producer_id', 'detail__bkge_class_id', 'detail__journal__reference',
+    'detail__client_account__client_code', 'detail__client_account__name', 'detail__details', 'amount', 'gst',
+)
+
+
+def materialize_statements(commission_period: CommissionPeriod, batch_size=1000) -> tuple[int, int]:
+    """
+    Writes the agent statements for commission_period: a summary row per agent, producer and bkge class, and a line
+    per fee with the journal and client details the statement shows. Fee lines are read in one joined query and
+    written in batches, replacing any statements already written for the period. Returns the summary and line counts.
+    """
+    with transaction.atomic():
+        AgentStatementSummary.objects.filter(period=commission_period).delete()
+        AgentStatementLine.objects.filter(period=commission_period).delete()
+        summaries = AgentStatementSummary.objects.bulk_create([
+            AgentStatementSummary(
+                period=commission_period, agent_id=row['agent'], producer_id=row['producer'],
+                bkge_class_id=row['bkge_class'], total_amount=row['total_amount'], total_gst=row['total_gst'],
+                fee_count=row['fee_count'],
+            )
+            for row in query_fee_totals(commission_period)
+        ], batch_size=batch_size)
+
+        line_count = 0
+        batch = []
+        fees = (
+            Fee.objects.filter(detail__journal__commission_period=commission_period)
+            .order_by('agent_id', 'detail__journal_id', 'detail_id')
+            .values_list(*LINE_FIELDS)
+        )
+        for (fee_id, agent_id, producer_id, bkge_class_id, reference, client_code, client_name, details, amount,
+             gst) in fees.iterator(chunk_size=batch_size):
+            batch.append(AgentStatementLine(
+                period=commission_period, agent_id=agent_id, fee_id=fee_id, producer_id=producer_id,
+                bkge_class_id=bkge_class_id, journal_reference=reference, client_code=client_code,
+                client_name=client_name, details=details, amount=amount, gst=gst,
+            ))
+            if len(batch) == batch_size:
+                AgentStatementLine.objects.bulk_create(batch)
+                line_count += len(batch)
+                batch = []
+        AgentStatementLine.objects.bulk_create(batch)
+        line_count += len(batch)
+    return len(summaries), line_count
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_save, post_delete
+from accounting.models import period_closed
+from fees.models import Agent, Deal, DealSplit, Journal, JournalDetail
+from fees.services.split_rules import SplitRuleIndex
+from fees.services.statements import materialize_statements
+
+
+# any change to deals, their splits or agents invalidates the compiled split rules
+for model in (Agent, Deal, DealSplit):
+    post_save.connect(SplitRuleIndex.invalidate, sender=model, dispatch_uid=f'split_rules_{model.__name__}_save')
+    post_delete.connect(SplitRuleIndex.invalidate, sender=model, dispatch_uid=f'split_rules_{model.__name__}_delete')
+
+
+def update_journal_credit_total(sender, instance, **kwargs):
+    Journal.update_credit_totals([instance.journal_id])
+
+
+# bulk_create sends no signals, so bulk inserts update the totals themselves; deletes are handled in
+# JournalDetail.delete rather than post_delete, which would stop cascades from deleting details in bulk
+post_save.connect(update_journal_credit_total, sender=JournalDetail, dispatch_uid='journal_credit_total_save')
+
+
+def write_agent_statements(sender, period, **kwargs):
+    materialize_statements(period)
+
+
+# runs inside the period-close transaction, so a failure here leaves the period open
+period_closed.connect(write_agent_statements, dispatch_uid='agent_statements_period_closed')
@@ -33,7 +33,7 @@ class DealSplitTable(Table):
 
 class JournalTable(Table):
     id = Column(linkify=True)
-    journal_amount = Column(orderable=False, accessor='total_credits')
+    journal_amount = Column(accessor='credit_total')
     check_result = Column(orderable=False, empty_values=())
     edit = TemplateColumn(template_code="<a href={% url 'fees:journal-edit' record.pk %}>Edit</a>", orderable=False)
     delete = TemplateColumn(template_code="<a class=journal-delete href={% url 'fees:journal-delete' record.pk %}>Delete</a>", orderable=False)
@@ -42,13 +42,12 @@ class JournalTable(Table):
     class Meta:
         model = Journal
         sequence = ('id', 'period_end_date', 'description', 'reference', 'cash_amount', 'journal_amount', 'check_result', 'producer', 'cash_account', 'status',)
-        exclude = ('commission_period',)
+        exclude = ('commission_period', 'credit_total', 'ledger_journal')
         orderable = True
 
     def render_check_result(self, record):
         # Render a tick or cross if cash amount matches journal credits
-        credit = record.total_credits()
-        if record.cash_amount == record.total_credits():
+        if record.cash_amount == record.credit_total:
             return format_html('<span style="color:green;">&#10003;</span>')  # ✓
         else:
             return format_html('<span style="color:red;">&#10007;</span>')    # ✗
@@ -127,4 +127,688 @@ class DotenvTestCase(TestCase):
         path = reverse('fees:deal-create')
         response = self.client.post(path, data=data)
         self.assertEqual(response.status_code, 302)
-        self.assertEqual(Deal.objects.count(), 1)
\ No newline at end of file
+        self.assertEqual(Deal.objects.count(), 1)
+
+class JournalFixtureMixin:
+
+    def setUp(self):
+        from accounting.models import Account, AccountType, AccountSubtype
+        from fees.models import ProducerClient
+        self.user = User.objects.create_user(username='test', password='pass')
+        account_type = AccountType.objects.create(account_type_code='ASSET', name='Asset')
+        subtype = AccountSubtype.objects.create(account_type=account_type, account_subtype_code='CASH', name='Cash')
+        cash_account = Account.objects.create(account_code='1000', account_subtype=subtype, name='Cash', status='A')
+        self.cash_account = cash_account
+        self.producer = Producer.objects.create(code='SQ1', name='Square One')
+        other_producer = Producer.objects.create(code='SFG', name='SFG')
+        self.trail = BkgeClass.objects.create(code='MXO', name='Mortgage Trail')
+        self.upfront = BkgeClass.objects.create(code='MXI', name='Mortgage Upfront')
+        agents = [
+            Agent.objects.create(agent_code=code, first_name=code, last_name='Agent', abn='1', address_1='1 St',
+                                 email='a@example.com', suburb='X', postcode='1000',
+                                 payable_account=Account.objects.create(account_code=f'2{i:03}', account_subtype=subtype,
+                                                                        name=f'{code} Payable', status='A'))
+            for i, code in enumerate(['HO1', 'JON', 'SAM'])
+        ]
+        split_deal = Deal.objects.create(code='SPL', name='Split Deal', agent=agents[0])
+        DealSplit.objects.create(deal=split_deal, agent=agents[1], percentage=33.3)
+        DealSplit.objects.create(deal=split_deal, agent=agents[2], percentage=33.3, bkge_class_filter=self.trail)
+        DealSplit.objects.create(deal=split_deal, agent=agents[2], percentage=10, producer_filter=other_producer)
+        full_deal = Deal.objects.create(code='FUL', name='Full Split', agent=agents[0])
+        DealSplit.objects.create(deal=full_deal, agent=agents[1], percentage=60)
+        DealSplit.objects.create(deal=full_deal, agent=agents[2], percentage=40)
+        solo_deal = Deal.objects.create(code='SOL', name='No Splits', agent=agents[1])
+        self.journal = Journal.objects.create(
+            period_end_date=dt.date.today(), description='Test', reference='T1', cash_amount=0,
+            cash_account=cash_account, producer=self.producer, status='OPEN')
+        for i, deal in enumerate([split_deal, full_deal, solo_deal]):
+            client = ProducerClient.objects.create(client_code=str(i), producer=self.producer, name=f'Client {i}',
+                                                   deal=deal, created_by=self.user)
+            for bkge_class, amount in [(self.trail, 123.45), (self.upfront, 1000.01)]:
+                JournalDetail.objects.create(
+                    journal=self.journal, client_account=client, bkge_class=bkge_class, amount=amount,
+                    gst=amount / 10, details=client.name, lender_amount=0, lender_gst=0, balance=0, limit=0)
+
+
+class FeeGeneratorTestCase(JournalFixtureMixin, TestCase):
+
+    @staticmethod
+    def _fee_tuples(fees):
+        return sorted((fee.detail_id, fee.agent_id, fee.amount, fee.gst) for fee in fees)
+
+    def test_batch_generator_matches_splitter(self):
+        from fees.services.journal_commit import FeeGenerator, BatchFeeGenerator
+        fee_generator = FeeGenerator()
+        fee_generator.get_journal_details(self.journal)
+        fee_generator.generate_fees()
+        batch_generator = BatchFeeGenerator()
+        batch_generator.get_journal_details(self.journal)
+        batch_generator.generate_fees()
+        self.assertEqual(self._fee_tuples(batch_generator.fees), self._fee_tuples(fee_generator.fees))
+        self.assertEqual(len(batch_generator.fees), 11)
+
+    def test_split_rule_index_invalidated_on_split_change(self):
+        from fees.services.split_rules import SplitRuleIndex
+        deal = Deal.objects.get(code='SOL')
+        self.assertEqual(SplitRuleIndex.get_rules(deal.id, self.producer.id, self.trail.id), [(deal.agent_id, 100)])
+        split = DealSplit.objects.create(deal=deal, agent=Agent.objects.get(agent_code='SAM'), percentage=25)
+        self.assertEqual(
+            SplitRuleIndex.get_rules(deal.id, self.producer.id, self.trail.id),
+            [(split.agent_id, 25), (deal.agent_id, 75)]
+        )
+        split.delete()
+        self.assertEqual(SplitRuleIndex.get_rules(deal.id, self.producer.id, self.trail.id), [(deal.agent_id, 100)])
+
+    def test_commit_sees_split_changes_made_in_another_process(self):
+        from django.utils.timezone import now
+        from fees.models import Fee
+        from fees.services.journal_commit import commit_journal
+        from fees.services.split_rules import SplitRuleIndex
+        deal = Deal.objects.get(code='FUL')
+        SplitRuleIndex.get_rules(deal.id, self.producer.id, self.trail.id)
+        # a save in another process, like a queryset update, sends no signals to this one
+        DealSplit.objects.filter(deal=deal, agent__agent_code='JON').update(percentage=50, updated_at=now())
+        DealSplit.objects.filter(deal=deal, agent__agent_code='SAM').update(percentage=50, updated_at=now())
+        commit_journal(self.journal)
+        fees = Fee.objects.filter(detail__client_account__deal=deal, detail__bkge_class=self.trail)
+        self.assertEqual(sorted(fees.values_list('amount', flat=True)), [61.725, 61.725])
+
+
+    def test_split_rules_reused_across_commits(self):
+        from unittest import mock
+        from django.utils.timezone import now
+        from fees.services.journal_commit import commit_journal
+        from fees.services.split_rules import SplitRuleIndex
+        SplitRuleIndex.invalidate()
+        other = Journal.objects.create(
+            period_end_date=dt.date.today(), description='Test', reference='T2', cash_amount=0,
+            cash_account=self.cash_account, producer=self.producer, status='OPEN')
+        for detail in self.journal.details.all():
+            detail.pk = None
+            detail.journal = other
+            detail.save()
+        commit_journal(self.journal)
+        with mock.patch.object(SplitRuleIndex, '_load', wraps=SplitRuleIndex._load) as load:
+            commit_journal(other)
+        load.assert_not_called()
+
+        # only the deals asked for are loaded, and only the changed ones are reloaded
+        solo, full = Deal.objects.get(code='SOL'), Deal.objects.get(code='FUL')
+        SplitRuleIndex.invalidate()
+        SplitRuleIndex.refresh([solo.id, full.id])
+        self.assertEqual(set(SplitRuleIndex._deals), {solo.id, full.id})
+        Deal.objects.filter(id=full.id).update(updated_at=now())
+        with mock.patch.object(SplitRuleIndex, '_load', wraps=SplitRuleIndex._load) as load:
+            SplitRuleIndex.refresh([solo.id, full.id])
+        self.assertEqual(load.call_args.args[0], [full.id])
+
+
+class FeeLedgerTestCase(JournalFixtureMixin, TestCase):
+
+    def test_commit_posts_summarized_ledger_journal(self):
+        from decimal import Decimal
+        from django.db.models import Sum
+        from accounting.models import Account, Entry
+        from fees.models import Fee
+        from fees.services.journal_commit import commit_journal
+        commit_journal(self.journal)
+        self.journal.refresh_from_db()
+        entries = Entry.objects.filter(journal=self.journal.ledger_journal)
+        # one credit per agent and bkge class that received fees, plus the cash debit
+        self.assertEqual(entries.count(), 7)
+        self.assertEqual(sum(entries.values_list('amount', flat=True)), 0)
+        fee_total = Fee.objects.filter(detail__journal=self.journal).aggregate(total=Sum('amount') + Sum('gst'))['total']
+        cash = Account.objects.get(id=self.cash_account.id)
+        self.assertAlmostEqual(cash.current_balance, Decimal(fee_total), places=1)
+        for agent in Agent.objects.all():
+            agent_fees = Fee.objects.filter(agent=agent).aggregate(total=Sum('amount') + Sum('gst'))['total']
+            self.assertAlmostEqual(-agent.payable_account.balance(), Decimal(agent_fees), places=1)
+
+    def test_commit_falls_back_to_default_payable_account(self):
+        from decimal import Decimal
+        from django.db.models import Sum
+        from accounting.models import Entry
+        from fees.models import Fee
+        from fees.services.fee_ledger import default_payable_account
+        from fees.services.journal_commit import commit_journal
+        Agent.objects.filter(agent_code='SAM').update(payable_account=None)
+        commit_journal(self.journal)
+        self.journal.refresh_from_db()
+        self.assertEqual(self.journal.status, 'CLOSED')
+        fallback = Entry.objects.filter(journal=self.journal.ledger_journal, account=default_payable_account())
+        self.assertTrue(fallback.exists())
+        self.assertTrue(all(entry.description.startswith('SAM ') for entry in fallback))
+        sam_fees = Fee.objects.filter(agent__agent_code='SAM').aggregate(total=Sum('amount') + Sum('gst'))['total']
+        self.assertAlmostEqual(-sum(fallback.values_list('amount', flat=True)), Decimal(sam_fees), places=1)
+
+
+class JournalUploadTestCase(JournalFixtureMixin, TestCase):
+
+    def test_streamed_upload_inserts_details_and_accounts(self):
+        from files.tests import build_sq1_workbook
+        from fees.services.journal_upload import upload_journal_stream
+        self.journal.details.all().delete()
+        summary = upload_journal_stream(build_sq1_workbook(rows=12), self.journal, self.user, chunk_size=5)
+        self.assertEqual(summary.inserted, 12)
+        self.assertEqual(summary.total_dropped, 0)
+        self.assertEqual(self.journal.details.count(), 12)
+        self.assertEqual(
+            set(self.journal.details.values_list('client_account__client_code', flat=True)),
+            {str(10000 + i) for i in range(12)}
+        )
+
+    def test_rows_with_unknown_codes_are_dropped_and_reported(self):
+        import pandas as pd
+        from fees.services.journal_upload import create_journal_details
+        self.journal.details.all().delete()
+        df = pd.DataFrame({
+            'account_code': ['0', '1', 'missing', '2'],
+            'name': ['Client 0', 'Client 1', 'Missing', 'Client 2'],
+            'product': ['CBA', None, 'CBA', 'CBA'],
+            'external_adviser': [None, None, None, None],
+            'bkge_code': ['MXO', 'MXI', 'MXO', 'XXX'],
+            'amount': [10.0, None, 5.0, 1.0],
+            'gst': [1.0, 0.5, 0.5, 0.1],
+            'lender_amount': [None] * 4,
+            'lender_gst': [None] * 4,
+            'limit': [None] * 4,
+            'balance': [None] * 4,
+        })
+        summary = create_journal_details(df, journal_id=self.journal.id, producer_id=self.producer.id)
+        self.assertEqual(summary.inserted, 2)
+        self.assertEqual(summary.dropped, {'unknown_bkge_code': 1, 'unknown_account_code': 1})
+        detail = self.journal.details.get(client_account__client_code='1')
+        self.assertEqual((detail.amount, detail.product), (0, None))
+
+    def test_missing_accounts_bulk_created_and_mapped(self):
+        import pandas as pd
+        from fees.models import ProducerClient
+        from fees.services import journal_upload
+        df = pd.DataFrame({'account_code': ['0', 'A1', 'A2', 'A2'], 'name': ['Client 0', 'New 1', 'New 2', 'New 2']})
+        with self.assertNumQueries(3):
+            account_map = journal_upload.reconcile_accounts(df, self.journal, self.user)
+        clients = dict(ProducerClient.objects.filter(producer=self.producer).values_list('client_code', 'id'))
+        self.assertEqual(account_map, {code: clients[code] for code in ['0', 'A1', 'A2']})
+        with self.assertNumQueries(1):
+            self.assertEqual(journal_upload.reconcile_accounts(df, self.journal, self.user), account_map)
+
+    def test_legacy_code_matches_left_unallocated_until_confirmed(self):
+        import pandas as pd
+        from fees.models import ProducerClient
+        from fees.services import journal_upload
+        deal = Deal.objects.get(code='SOL')
+        # the old clean_accounts stored both '10000' and '20000' as '0', which the fixture's client 0 now holds
+        ProducerClient.objects.filter(producer=self.producer, client_code='0').update(deal=deal)
+        df = pd.DataFrame({'account_code': ['10000', '20000', '305'], 'name': ['A', 'B', 'C']})
+        journal_upload.reconcile_accounts(df, self.journal, self.user)
+        clients = ProducerClient.objects.filter(producer=self.producer, client_code__in=df.account_code)
+        self.assertEqual(dict(clients.values_list('client_code', 'deal')), {'10000': None, '20000': None, '305': None})
+        candidates = journal_upload.legacy_deal_candidates(clients)
+        self.assertEqual(sorted((client.client_code, candidate.client_code) for client, candidate in candidates),
+                         [('10000', '0'), ('20000', '0')])
+
+        client = clients.get(client_code='10000')
+        JournalDetail.objects.create(
+            journal=self.journal, client_account=client, bkge_class=self.trail, amount=1, gst=0.1, details='A',
+            lender_amount=0, lender_gst=0, balance=0, limit=0)
+        CommissionPeriod.get_create_current_period()
+        self.client.login(username='test', password='pass')
+        response = self.client.get(reverse('fees:journal-detail', kwargs={'pk': self.journal.id}))
+        self.assertEqual([(c.client_code, m.client_code) for c, m in response.context['legacy_candidates']],
+                         [('10000', '0')])
+        self.client.post(reverse('fees:journal-legacy-deal', kwargs={'pk': self.journal.id, 'client_id': client.id}))
+        client.refresh_from_db()
+        self.assertEqual(client.deal, deal)
+        with self.assertRaises(ValueError):
+            journal_upload.allocate_legacy_deal(clients.get(client_code='305'), self.user)
+
+    def test_account_lookup_is_chunked(self):
+        from unittest import mock
+        from fees.services import journal_upload
+        codes = [str(i) for i in range(5)]
+        with mock.patch.object(journal_upload, 'ACCOUNT_LOOKUP_CHUNK_SIZE', 2), self.assertNumQueries(3):
+            account_map = journal_upload.lookup_accounts(codes, self.producer.id)
+        self.assertEqual(sorted(account_map), ['0', '1', '2'])
+
+
+class JournalJobTestCase(JournalFixtureMixin, TestCase):
+
+    def setUp(self):
+        import tempfile
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = self.settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def test_upload_job_is_safe_to_retry(self):
+        import datetime
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from files.tests import build_sq1_workbook
+        from fees.models import JournalJob
+        from fees.services import journal_jobs
+        self.journal.details.all().delete()
+        upload = SimpleUploadedFile('sq1.xlsx', build_sq1_workbook(rows=12).read())
+        job = journal_jobs.enqueue_upload(self.journal, upload, self.user)
+
+        claimed = journal_jobs.claim_next_job()
+        self.assertEqual(claimed.id, job.id)
+        self.assertIsNone(journal_jobs.claim_next_job())
+        # the worker inserts every chunk but dies before marking the job done
+        journal_jobs._run_upload(claimed, chunk_size=5)
+        JournalJob.objects.filter(id=job.id).update(heartbeat_at=datetime.datetime(2000, 1, 1, tzinfo=datetime.UTC))
+        self.assertEqual(journal_jobs.requeue_stale_jobs(datetime.timedelta(minutes=10)), 1)
+
+        journal_jobs.run_job(journal_jobs.claim_next_job(), chunk_size=5)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JournalJob.DONE, 2), job.error)
+        self.assertEqual((job.rows_parsed, job.details_inserted), (12, 12))
+        self.assertEqual(self.journal.details.count(), 12)
+
+    def test_commit_job_generates_fees(self):
+        from fees.models import Fee, JournalJob
+        from fees.services.journal_jobs import enqueue_commit, claim_next_job, run_job
+        job = enqueue_commit(self.journal, self.user)
+        run_job(claim_next_job())
+        job.refresh_from_db()
+        self.journal.refresh_from_db()
+        self.assertEqual(job.status, JournalJob.DONE, job.error)
+        self.assertEqual(self.journal.status, 'CLOSED')
+        self.assertEqual(job.fees_generated, Fee.objects.filter(detail__journal=self.journal).count())
+        self.assertEqual(job.fees_generated, 11)
+
+    def test_journal_is_committed_once(self):
+        from fees.models import Fee, JournalJob
+        from fees.services.journal_commit import commit_journal
+        from fees.services.journal_jobs import enqueue_commit, claim_next_job, run_job
+        job = enqueue_commit(self.journal, self.user)
+        claimed = claim_next_job()
+        stale_copy = Journal.objects.get(id=self.journal.id)
+        commit_journal(self.journal)
+        # the stale instance still reads OPEN, but the claim inside the transaction refuses it
+        with self.assertRaisesMessage(ValueError, 'is not open'):
+            commit_journal(stale_copy)
+        run_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JournalJob.DONE, job.error)
+        self.assertEqual(Fee.objects.filter(detail__journal=self.journal).count(), 11)
+        self.assertEqual(Journal.objects.filter(ledger_journal__isnull=False).count(), 1)
+
+    def test_upload_and_commit_never_overlap(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from files.tests import build_sq1_workbook
+        from fees.models import JournalJob, ProducerClient
+        from fees.services import journal_jobs
+        from fees.services.journal_commit import commit_journal
+        upload = SimpleUploadedFile('sq1.xlsx', build_sq1_workbook(rows=12).read())
+        job = journal_jobs.enqueue_upload(self.journal, upload, self.user)
+        claimed = journal_jobs.claim_next_job()
+        with self.assertRaisesMessage(ValueError, 'upload in progress'):
+            commit_journal(self.journal)
+        with self.assertRaisesMessage(ValueError, 'already has a job in progress'):
+            journal_jobs.enqueue_commit(self.journal, self.user)
+        journal_jobs.run_job(claimed, chunk_size=5)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JournalJob.DONE, job.error)
+        ProducerClient.objects.filter(deal__isnull=True).update(deal=Deal.objects.get(code='SOL'))
+        commit_journal(self.journal)
+        self.assertEqual(self.journal.details.count(), 18)
+        self.assertFalse(self.journal.details.filter(fee__isnull=True).exists())
+        with self.assertRaisesMessage(ValueError, 'is not open'):
+            journal_jobs.enqueue_upload(self.journal, upload, self.user)
+
+    def test_upload_job_stops_when_journal_closes(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from files.tests import build_sq1_workbook
+        from fees.models import JournalJob
+        from fees.services import journal_jobs
+        upload = SimpleUploadedFile('sq1.xlsx', build_sq1_workbook(rows=12).read())
+        job = journal_jobs.enqueue_upload(self.journal, upload, self.user)
+        claimed = journal_jobs.claim_next_job()
+        Journal.objects.filter(id=self.journal.id).update(status='CLOSED')
+        journal_jobs.run_job(claimed, chunk_size=5)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JournalJob.FAILED)
+        self.assertIn('is not open', job.error)
+        self.assertFalse(JournalDetail.objects.filter(upload_job=job).exists())
+
+    def test_claim_skips_journals_with_running_job(self):
+        from fees.models import JournalJob
+        from fees.services.journal_jobs import claim_next_job
+        first = JournalJob.objects.create(journal=self.journal, kind=JournalJob.UPLOAD, created_by=self.user)
+        second = JournalJob.objects.create(journal=self.journal, kind=JournalJob.COMMIT, created_by=self.user)
+        self.assertEqual(claim_next_job().id, first.id)
+        self.assertIsNone(claim_next_job())
+        JournalJob.objects.filter(id=first.id).update(status=JournalJob.DONE)
+        self.assertEqual(claim_next_job().id, second.id)
+
+    def test_journal_page_polls_active_job(self):
+        from fees.services.journal_jobs import enqueue_commit
+        CommissionPeriod.get_create_current_period()
+        job = enqueue_commit(self.journal, self.user)
+        self.client.login(username='test', password='pass')
+        response = self.client.get(reverse('fees:journal-detail', kwargs={'pk': self.journal.id}))
+        self.assertContains(response, 'data-active="1"')
+        status = self.client.get(reverse('fees:journal-job-status', kwargs={'pk': self.journal.id}), {'job': job.id})
+        self.assertEqual(status.json()['status'], 'QUEUED')
+        for bad_job in ('abc', '', '1.5'):
+            response = self.client.get(reverse('fees:journal-job-status', kwargs={'pk': self.journal.id}),
+                                       {'job': bad_job})
+            self.assertEqual(response.status_code, 404)
+
+
+class JournalBatchUploadTestCase(JournalFixtureMixin, TestCase):
+
+    def setUp(self):
+        import tempfile
+        super().setUp()
+        for setting in ('PARSE_CACHE_DIR', 'MEDIA_ROOT'):
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            override = self.settings(**{setting: directory.name})
+            override.enable()
+            self.addCleanup(override.disable)
+
+    def test_batch_upload_queued_and_parsed_together(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from files.tests import build_sq1_workbook
+        from fees.models import JournalJob
+        from fees.services.journal_batch_upload import enqueue_upload_batch, run_upload_batch
+        from fees.services.journal_jobs import claim_next_job
+        journals = [self.journal] + [
+            Journal.objects.create(period_end_date=dt.date.today(), description='Test', reference=f'T{i}',
+                                   cash_amount=0, cash_account=self.cash_account, producer=self.producer,
+                                   status='OPEN')
+            for i in (2, 3)
+        ]
+        self.journal.details.all().delete()
+        items = [
+            (journals[0], SimpleUploadedFile('a.xlsx', build_sq1_workbook(rows=7).read())),
+            (journals[1], SimpleUploadedFile('broken.xlsx', b'not a workbook')),
+            (journals[2], SimpleUploadedFile('b.xlsx', build_sq1_workbook(rows=9).read())),
+            (journals[0], SimpleUploadedFile('c.xlsx', build_sq1_workbook(rows=3).read())),
+        ]
+        results = enqueue_upload_batch(items, self.user)
+        self.assertEqual([result.file_name for result in results], ['a.xlsx', 'broken.xlsx', 'b.xlsx', 'c.xlsx'])
+        self.assertEqual([result.ok for result in results], [True, True, True, False])
+        self.assertIn('already has a job in progress', results[3].error)
+
+        jobs = [claim_next_job(JournalJob.UPLOAD) for _ in range(3)]
+        self.assertIsNone(claim_next_job())
+        run_upload_batch(jobs, max_workers=2)
+        # the two readable files were parsed on the pool and the jobs read them back from the parse cache
+        self.assertEqual(len(list(Path(settings.PARSE_CACHE_DIR).glob('*.parquet'))), 2)
+        jobs = JournalJob.objects.order_by('id')
+        self.assertEqual([job.status for job in jobs], [JournalJob.DONE, JournalJob.FAILED, JournalJob.DONE])
+        self.assertEqual([job.details_inserted for job in jobs], [7, 0, 9])
+        self.assertEqual([journal.details.count() for journal in journals], [7, 0, 9])
+
+    def test_batch_upload_page_renders(self):
+        CommissionPeriod.get_create_current_period()
+        self.client.login(username='test', password='pass')
+        response = self.client.get(reverse('fees:journal-batch-upload'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Batch Upload')
+        self.assertEqual(response.context['formset'].total_form_count(), 20)
+
+
+class JournalCreditTotalTestCase(JournalFixtureMixin, TestCase):
+
+    def assert_credit_total_current(self):
+        self.journal.refresh_from_db()
+        self.assertAlmostEqual(self.journal.credit_total, self.journal.total_credits())
+
+    def test_credit_total_follows_detail_changes(self):
+        from files.tests import build_sq1_workbook
+        from fees.services.journal_upload import upload_journal_stream
+        self.assert_credit_total_current()
+        detail = self.journal.details.first()
+        detail.amount = 5000
+        detail.save()
+        self.assert_credit_total_current()
+        detail.delete()
+        self.assert_credit_total_current()
+        upload_journal_stream(build_sq1_workbook(rows=12), self.journal, self.user, chunk_size=5)
+        self.assert_credit_total_current()
+
+    def test_journal_list_queries_do_not_grow_with_journals(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        CommissionPeriod.get_create_current_period()
+        self.client.login(username='test', password='pass')
+        with CaptureQueriesContext(connection) as one_journal:
+            self.client.get(reverse('fees:journals'))
+        for reference in ['T2', 'T3', 'T4']:
+            Journal.objects.create(
+                period_end_date=dt.date.today(), description='Test', reference=reference, cash_amount=0,
+                cash_account=self.journal.cash_account, producer=self.producer, status='OPEN')
+        with CaptureQueriesContext(connection) as four_journals:
+            response = self.client.get(reverse('fees:journals'))
+        self.assertContains(response, 'T4')
+        self.assertEqual(len(four_journals), len(one_journal))
+
+
+class PeriodReportingTestCase(JournalFixtureMixin, TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from fees.services.journal_commit import commit_journal
+        super().setUp()
+        cache.clear()
+        commit_journal(self.journal)
+        self.journal.refresh_from_db()
+        self.period = self.journal.commission_period
+
+    def test_period_fees_grouped_by_agent_producer_and_bkge_class(self):
+        from fees.models import Fee
+        from fees.services.period_reporting import period_fee_totals
+        rows = period_fee_totals(self.period)
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(sum(row['fee_count'] for row in rows), Fee.objects.count())
+        jon = Agent.objects.get(agent_code='JON')
+        jon_trail = period_fee_totals(self.period, agent=jon, producer=self.producer, bkge_class=self.trail)
+        fees = Fee.objects.filter(agent=jon, detail__bkge_class=self.trail)
+        self.assertEqual(len(jon_trail), 1)
+        self.assertEqual(jon_trail[0]['fee_count'], fees.count())
+        self.assertAlmostEqual(jon_trail[0]['total_amount'], sum(fees.values_list('amount', flat=True)))
+        self.assertAlmostEqual(jon_trail[0]['total_gst'], sum(fees.values_list('gst', flat=True)))
+
+    def test_processed_period_report_is_cached(self):
+        from fees.services.period_reporting import period_fee_totals
+        self.period.processed = True
+        self.period.save()
+        rows = period_fee_totals(self.period)
+        with self.assertNumQueries(0):
+            self.assertEqual(period_fee_totals(self.period), rows)
+            self.assertEqual(len(period_fee_totals(self.period, bkge_class=self.upfront)), 3)
+
+
+    def test_cached_report_stays_current_after_close(self):
+        from fees.models import Fee
+        from fees.services.journal_commit import commit_journal
+        self.period.processed = True
+        self.period.save()
+        rows = self.period.get_period_fees()
+        late = Journal.objects.create(
+            period_end_date=dt.date.today(), description='Late', reference='T2', cash_amount=0,
+            cash_account=self.cash_account, producer=self.producer, status='OPEN')
+        detail = self.journal.details.first()
+        detail.pk = None
+        detail.journal = late
+        detail.save()
+        commit_journal(late)
+        fee_count = Fee.objects.filter(detail__journal__commission_period=self.period).count()
+        self.assertEqual(sum(row['fee_count'] for row in self.period.get_period_fees()), fee_count)
+        self.assertEqual(self.period.get_period_fees(), rows)
+        jon = Agent.objects.get(agent_code='JON')
+        self.assertEqual(self.period.get_period_fees(agent=jon), [row for row in rows if row['agent'] == jon.id])
+
+
+class AgentStatementTestCase(JournalFixtureMixin, TestCase):
+
+    def test_statements_materialized_at_period_close(self):
+        from accounting.models import CommissionPeriod
+        from fees.models import AgentStatementLine, AgentStatementSummary, Fee
+        from fees.services.journal_commit import commit_journal
+        commit_journal(self.journal)
+        self.journal.refresh_from_db()
+        CommissionPeriod.close_and_create_new_period()
+        period = self.journal.commission_period
+
+        summaries = AgentStatementSummary.objects.filter(period=period)
+        self.assertEqual(summaries.count(), 6)
+        self.assertEqual(sum(summaries.values_list('fee_count', flat=True)), Fee.objects.count())
+        lines = AgentStatementLine.objects.filter(period=period)
+        self.assertEqual(lines.count(), Fee.objects.count())
+        fee = Fee.objects.select_related('detail__client_account').filter(agent__agent_code='SAM').first()
+        line = lines.get(fee=fee)
+        self.assertEqual((line.agent_id, line.producer, line.bkge_class_id), (fee.agent_id, self.producer,
+                                                                               fee.detail.bkge_class_id))
+        self.assertEqual((line.journal_reference, line.client_code, line.client_name, line.amount, line.gst),
+                         ('T1', fee.detail.client_account.client_code, fee.detail.client_account.name, fee.amount,
+                          fee.gst))
+
+
+    def test_commits_after_close_go_to_the_next_period(self):
+        from accounting.models import CommissionPeriod
+        from fees.models import AgentStatementLine, Fee
+        from fees.services.journal_commit import commit_journal
+        commit_journal(self.journal)
+        self.journal.refresh_from_db()
+        next_period = CommissionPeriod.close_and_create_new_period()
+        late = Journal.objects.create(
+            period_end_date=dt.date.today(), description='Late', reference='T2', cash_amount=0,
+            cash_account=self.cash_account, producer=self.producer, status='OPEN')
+        for detail in self.journal.details.all()[:2]:
+            detail.pk = None
+            detail.journal = late
+            detail.save()
+        commit_journal(late)
+        late.refresh_from_db()
+        self.assertEqual(late.commission_period, next_period)
+        closed = self.journal.commission_period
+        self.assertEqual(Fee.objects.filter(detail__journal__commission_period=closed).count(),
+                         AgentStatementLine.objects.filter(period=closed).count())
+
+
+class ExportTestCase(JournalFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(username='test', password='pass')
+
+    def test_journal_details_csv_streams(self):
+        import csv
+        response = self.client.get(reverse('fees:journal-export', kwargs={'pk': self.journal.id, 'file_format': 'csv'}))
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['Client Code', 'Client Name', 'Bkge Class'])
+        self.assertEqual(len(rows), 1 + self.journal.details.count())
+        self.assertEqual(rows[1][:3], ['0', 'Client 0', 'MXO'])
+
+    def test_period_fees_xlsx(self):
+        import io
+        from openpyxl import load_workbook
+        from fees.models import Fee
+        from fees.services.journal_commit import commit_journal
+        commit_journal(self.journal)
+        self.journal.refresh_from_db()
+        response = self.client.get(reverse('fees:period-fees-export', kwargs={
+            'period_id': self.journal.commission_period_id, 'file_format': 'xlsx'}))
+        self.assertTrue(response.streaming)
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.values)
+        self.assertEqual(rows[0][:3], ('Journal', 'Producer', 'Agent'))
+        self.assertEqual(len(rows), 1 + Fee.objects.count())
+        self.assertAlmostEqual(sum(row[6] for row in rows[1:]), sum(Fee.objects.values_list('amount', flat=True)))
+
+    def test_unknown_export_format(self):
+        response = self.client.get(reverse('fees:journal-export', kwargs={'pk': self.journal.id, 'file_format': 'pdf'}))
+        self.assertEqual(response.status_code, 404)
+
+
+class JournalDetailPagingTestCase(JournalFixtureMixin, TestCase):
+
+    def _page(self, **params):
+        from unittest import mock
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from fees.views import JournalDetailView
+        with mock.patch.object(JournalDetailView, 'jd_per_page', 4), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('fees:journal-detail', kwargs={'pk': self.journal.id}), params)
+        return response.context['jd_page'], len(queries)
+
+    def test_journal_details_keyset_paged(self):
+        CommissionPeriod.get_create_current_period()
+        self.client.login(username='test', password='pass')
+        ids = list(self.journal.details.order_by('id').values_list('id', flat=True))
+        first, first_queries = self._page()
+        self.assertEqual([detail.id for detail in first.rows], ids[:4])
+        self.assertEqual((first.next_after, first.previous_before), (ids[3], None))
+        second, second_queries = self._page(after=first.next_after)
+        self.assertEqual([detail.id for detail in second.rows], ids[4:])
+        self.assertEqual((second.next_after, second.previous_before), (None, ids[4]))
+        back, _ = self._page(before=second.previous_before)
+        self.assertEqual([detail.id for detail in back.rows], ids[:4])
+        self.assertEqual((back.next_after, back.previous_before), (ids[3], None))
+        # bkge class and client account are joined, not fetched per row
+        self.assertEqual(first_queries, second_queries)
+
+
+class ClientSearchTestCase(JournalFixtureMixin, TestCase):
+
+    def setUp(self):
+        from fees.models import ProducerClient
+        super().setUp()
+        self.smith = ProducerClient.objects.create(client_code='ABC123', producer=self.producer, name='John Smith',
+                                                   created_by=self.user)
+        self.smithers = ProducerClient.objects.create(client_code='XYZ789', producer=Producer.objects.get(code='SFG'),
+                                                      name='Wayland Smithers', created_by=self.user)
+
+    def _codes(self, page):
+        return [row['client_code'] for row in page.rows]
+
+    def test_substring_and_prefix_search(self):
+        from fees.services.client_search import has_search_index, search_clients
+        self.assertTrue(has_search_index())
+        self.assertEqual(self._codes(search_clients('mith')), ['ABC123', 'XYZ789'])
+        self.assertEqual(self._codes(search_clients('c12')), ['ABC123'])
+        self.assertEqual(self._codes(search_clients('Wa')), ['XYZ789'])
+        self.assertEqual(self._codes(search_clients('smith', producer=self.producer.id)), ['ABC123'])
+        self.assertEqual(self._codes(search_clients('client', deal=Deal.objects.get(code='SOL').id)), ['2'])
+        self.assertEqual(self._codes(search_clients(unallocated=True)), ['ABC123', 'XYZ789'])
+
+    def test_search_index_follows_client_changes(self):
+        from fees.services.client_search import search_clients
+        self.smith.name = 'Jane Doe'
+        self.smith.save()
+        self.assertEqual(self._codes(search_clients('smith')), ['XYZ789'])
+        self.assertEqual(self._codes(search_clients('doe')), ['ABC123'])
+        self.smithers.delete()
+        self.assertEqual(self._codes(search_clients('smith')), [])
+
+    def test_search_api_pages_by_id(self):
+        self.client.login(username='test', password='pass')
+        url = reverse('fees:client-search-api')
+        first = self.client.get(url, {'q': 'client'}).json()
+        self.assertEqual([row['client_code'] for row in first['results']], ['0', '1', '2'])
+        self.assertIsNone(first['next_after'])
+        from fees.services.client_search import search_clients
+        page = search_clients(per_page=2)
+        self.assertEqual(self._codes(page), ['0', '1'])
+        response = self.client.get(url, {'after': page.next_after, 'producer': self.producer.id}).json()
+        self.assertEqual([row['client_code'] for row in response['results']], ['2', 'ABC123'])
+        self.assertEqual(response['previous_before'], response['results'][0]['id'])
+
+    def test_client_list_tables_paginated(self):
+        from unittest import mock
+        from fees.views import ProducerClientListView
+        CommissionPeriod.get_create_current_period()
+        self.client.login(username='test', password='pass')
+        with mock.patch.object(ProducerClientListView, 'per_page', 1):
+            response = self.client.get(reverse('fees:clients'), {'unassigned-page': 2})
+        self.assertEqual(response.status_code, 200)
+        unassigned = response.context['unassigned_clients_table']
+        self.assertEqual([row.record.client_code for row in unassigned.page.object_list], ['XYZ789'])
+        self.assertEqual(len(response.context['clients_table'].page.object_list), 1)
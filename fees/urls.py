@@ -4,9 +4,10 @@ from .views import (agent_search_view, agent_create_view, journals_search_view,
     journals_create_view, deals_search_view,
     deals_create_view, agent_view, split_create_view, journal_view,
     journal_detail_create_view,
-    client_create_view, client_search_view, client_edit_view, journal_commit_view,
+    client_create_view, client_search_view, client_search_api_view, client_edit_view, journal_commit_view,
     journal_delete_view,
-    journal_detail_delete_view, journal_upload_view,
+    journal_detail_delete_view, journal_upload_view, journal_commit_background_view, journal_job_status_view,
+    journal_batch_upload_view, journal_export_view, journal_legacy_deal_view, period_fees_export_view, agent_statement_export_view,
     AgentListView, AgentDetailView, AgentUpdateView, AgentCreateView, DealListView,
     DealDetailView, DealUpdateView,
     SplitUpdateView, SplitCreateView, SplitDeleteView, DealCreateView, JournalListView,
@@ -24,6 +25,7 @@ urlpatterns = [
     path('agents/<int:pk>', AgentDetailView.as_view(), name='agent-detail'),
     path('agents/<int:pk>/edit', AgentUpdateView.as_view(), name='agent-edit'),
     path('clients/', ProducerClientListView.as_view(), name='clients'),
+    path('clients/search', client_search_api_view, name='client-search-api'),
     path('clients/create', ProducerClientCreateView.as_view(), name='client-create'),
     path('clients/<int:pk>/edit', ProducerClientUpdateView.as_view(), name='client-edit'),
     path('deals/', DealListView.as_view(), name='deals'),
@@ -35,6 +37,7 @@ urlpatterns = [
     path('splits/<int:pk>/delete', SplitDeleteView.as_view(), name='split-delete'),
     path('journals/', JournalListView.as_view(), name='journals'),
     path('journals/create', JournalCreateView.as_view(), name='journal-create'),
+    path('journals/upload', journal_batch_upload_view, name='journal-batch-upload'),
     path('journals/<int:pk>', JournalDetailView.as_view(), name='journal-detail'),
     path('journals/<int:pk>/edit', JournalUpdateView.as_view(), name='journal-edit'),
     path('journals/<int:pk>/delete', JournalDeleteView.as_view(), name='journal-delete'),
@@ -43,6 +46,13 @@ urlpatterns = [
     path('journal-details/<int:pk>/delete', JDDeleteView.as_view(), name='jd-delete'),
     path('journals/<int:pk>/upload', journal_upload_view, name='journal-upload'),
     path('journals/<int:pk>/commit', journal_commit_view, name='journal-commit'),
+    path('journals/<int:pk>/legacy-deals/<int:client_id>', journal_legacy_deal_view, name='journal-legacy-deal'),
+    path('journals/<int:pk>/commit/background', journal_commit_background_view, name='journal-commit-background'),
+    path('journals/<int:pk>/job-status', journal_job_status_view, name='journal-job-status'),
+    path('journals/<int:pk>/export/<str:file_format>', journal_export_view, name='journal-export'),
+    path('periods/<int:period_id>/fees/export/<str:file_format>', period_fees_export_view, name='period-fees-export'),
+    path('agents/<int:pk>/statements/<int:period_id>/export/<str:file_format>', agent_statement_export_view,
+         name='agent-statement-export'),
     path('bkgeclasses', BkgeClassListView.as_view(), name='bkgeclasses'),
     path('bkgeclasses/create', BkgeClassCreateView.as_view(), name='bkgeclass-create'),
     path('bkgeclasses/<int:pk>/edit', BkgeClassUpdateView.as_view(), name='bkgeclass-edit'),
@@ -2,26 +2,33 @@ from typing import Any
 import datetime as dt
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.utils.http import url_has_allowed_host_and_scheme
-from django.db import transaction
 
 from django.views.generic import ListView, DetailView, UpdateView, DeleteView, CreateView, TemplateView
-from django_tables2 import SingleTableView, MultiTableMixin, SingleTableMixin
+from django_tables2 import SingleTableView, MultiTableMixin, SingleTableMixin, RequestConfig
 from django.urls import reverse_lazy, reverse
 
-from .models import Fee, Agent, Journal, Deal, DealSplit, ProducerClient, JournalDetail, Producer, Fee, BkgeClass
+from .models import Fee, Agent, Journal, Deal, DealSplit, ProducerClient, JournalDetail, Producer, Fee, BkgeClass, JournalJob, AgentStatementLine
 from .forms import (AgentForm, JournalForm, DealForm, DealSplitForm, JournalDetailForm, BkgeClassForm,
-                    ProducerClientForm, DeleteConfirmForm, UploadFileForm, JournalCommitConfirmForm, ProducerForm)
+                    ProducerClientForm, DeleteConfirmForm, UploadFileForm, JournalCommitConfirmForm, ProducerForm,
+                    BatchUploadFormSet)
 from .tables import (AgentTable, DealTable, DealSplitTable, JournalTable,
                      ProducerClientTable, JDTable, BkgeClassTable, ProducerTable)
 from accounting.models import CommissionPeriod
 from .filters import ProducerClientFilter, JournalFilter
 
-from files.producer_dispatcher import ProducerCleanerRegistry
-from .services.journal_upload import add_missing_accounts, create_journal_details
-from .services.journal_commit import FeeGenerator
+from files.parse_cache import cached_clean
+from .services.journal_upload import (reconcile_accounts, create_journal_details, upload_journal_stream,
+                                      legacy_deal_candidates, allocate_legacy_deal)
+from .services.journal_commit import commit_journal
+from .services.journal_jobs import enqueue_upload, enqueue_commit
+from .services.journal_batch_upload import enqueue_upload_batch
+from .pagination import keyset_page, keyset_params
+from .services.client_search import search_clients
+from .services.exports import export_response, JOURNAL_DETAIL_COLUMNS, FEE_COLUMNS, STATEMENT_COLUMNS
 
 from django.contrib import messages
 
@@ -278,16 +285,19 @@ class AgentListView(FeesListView):
 @method_decorator(login_required, name="dispatch")
 class ProducerClientListView(TemplateView):
     template_name = 'fees/producer_clients_search.html'
+    per_page = 50
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        unassigned_clients = ProducerClient.objects.filter(deal=None).all()
-        clients_qs = ProducerClient.objects.filter(deal__isnull=False).all()
-        client_filter = ProducerClientFilter(self.request.GET, queryset=clients_qs)
+        clients = ProducerClient.objects.select_related('producer', 'deal').order_by('id')
+        unassigned_clients = clients.filter(deal=None)
+        client_filter = ProducerClientFilter(self.request.GET, queryset=clients.filter(deal__isnull=False))
         context['title'] = 'Producer Clients'
-        context['unassigned_clients_table'] = ProducerClientTable(unassigned_clients)
+        context['unassigned_clients_table'] = ProducerClientTable(unassigned_clients, prefix='unassigned-')
         context['client_filter'] = client_filter
-        context['clients_table'] = ProducerClientTable(client_filter.qs)
+        context['clients_table'] = ProducerClientTable(client_filter.qs, prefix='clients-')
+        for table in (context['unassigned_clients_table'], context['clients_table']):
+            RequestConfig(self.request, paginate={'per_page': self.per_page}).configure(table)
         context['create_link'] = reverse('fees:client-create')
         return context
 
@@ -313,7 +323,7 @@ class JournalListView(FeesListView):
     }
 
     def get_queryset(self):
-        return Journal.objects.filter(status='OPEN')
+        return Journal.objects.filter(status='OPEN').select_related('producer', 'cash_account')
 
 
 @method_decorator(login_required, name="dispatch")
@@ -386,6 +396,7 @@ class JournalDetailView(DetailView):
     template_name = 'fees/journal_detail.html'
     #table_class = JDTable
     table_pagination = {"per_page": 20}
+    jd_per_page = 100
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -393,8 +404,18 @@ class JournalDetailView(DetailView):
         context['title'] = f'Journal {self.object}'
         context['create_link'] = reverse('fees:jd-create', kwargs={'journal_id':self.object.id}  )
         context['upload_link'] = reverse('fees:journal-upload', kwargs={'pk':self.object.id})
-        context['unallocated_accounts_table'] = ProducerClientTable(self.get_unallocated_accounts_data())
-        context['jd_table'] = JDTable(self.object.details.all())
+        unallocated_accounts = self.get_unallocated_accounts_data()
+        context['unallocated_accounts_table'] = ProducerClientTable(unallocated_accounts)
+        context['legacy_candidates'] = legacy_deal_candidates(unallocated_accounts)
+        details = self.object.details.select_related('bkge_class', 'client_account')
+        page = keyset_page(details, self.jd_per_page, **keyset_params(self.request.GET))
+        # rows are in id order for keyset paging, so the table's own sorting is switched off
+        context['jd_table'] = JDTable(page.rows, orderable=False)
+        context['jd_page'] = page
+        context['job'] = self.object.jobs.order_by('-id').first()
+        context['commit_background_link'] = reverse('fees:journal-commit-background', kwargs={'pk': self.object.id})
+        context['export_csv_link'] = reverse('fees:journal-export', kwargs={'pk': self.object.id, 'file_format': 'csv'})
+        context['export_xlsx_link'] = reverse('fees:journal-export', kwargs={'pk': self.object.id, 'file_format': 'xlsx'})
         return context
 
     def get_unallocated_accounts_data(self):
@@ -678,31 +699,145 @@ def journal_upload_view(request, pk):
         return render(request, 'files/file_upload.html', {'form': form, 'journal': journal})
 
     uploaded_file = request.FILES['file']
-    df = ProducerCleanerRegistry.clean(journal.producer.code, uploaded_file)
-    add_missing_accounts(df, journal, request.user)
-    create_journal_details(df, journal_id=pk, producer_id=journal.producer.id)
-
+    if form.cleaned_data['background']:
+        try:
+            enqueue_upload(journal, uploaded_file, request.user)
+        except ValueError as e:
+            messages.warning(request, str(e))
+        else:
+            messages.success(request, 'Upload queued for background processing.')
+        return redirect('fees:journal-detail', pk=pk)
+
+    if form.cleaned_data['stream']:
+        try:
+            summary = upload_journal_stream(uploaded_file, journal, request.user)
+        except ValueError as e:
+            messages.warning(request, str(e))
+            return redirect('fees:journal-detail', pk=pk)
+    else:
+        df = cached_clean(journal.producer.code, uploaded_file)
+        account_map = reconcile_accounts(df, journal, request.user)
+        summary = create_journal_details(df, journal_id=pk, producer_id=journal.producer.id, account_map=account_map)
+
+    messages.success(request, f'{summary.inserted} journal details uploaded.')
+    if summary.total_dropped:
+        reasons = ', '.join(f'{count} {reason.replace("_", " ")}' for reason, count in summary.dropped.items() if count)
+        messages.warning(request, f'{summary.total_dropped} rows dropped ({reasons}).')
     return redirect('fees:journal-detail', pk=pk)
 
 
+@login_required
+def journal_batch_upload_view(request):
+    formset = BatchUploadFormSet(request.POST or None, request.FILES or None)
+    context = {'formset': formset, 'title': 'Batch Upload'}
+    if request.method == 'POST' and formset.is_valid():
+        items = [(form.cleaned_data['journal'], form.cleaned_data['file']) for form in formset if form.cleaned_data]
+        context['results'] = enqueue_upload_batch(items, request.user)
+        context['formset'] = BatchUploadFormSet()
+    return render(request, 'fees/journal_batch_upload.html', context)
+
+
 @login_required
 def journal_commit_view(request, pk):
-    print('committing',pk)
-    journal = Journal.objects.get(id=pk)
-    unallocated_accounts = journal.get_accounts_with_null_deal()
-    if not journal or not journal.status == 'OPEN':
-        return redirect('fees:journals')
-    if unallocated_accounts:
-        return redirect('fees:journals')
-    with transaction.atomic():
-        journal.commission_period = CommissionPeriod.get_current_period()
-        fee_generator = FeeGenerator()
-        fee_generator.get_journal_details(journal)
-        fee_generator.generate_fees()
-        Fee.objects.bulk_create(fee_generator.fees)
-        journal.status = 'CLOSED'
-        journal.save()
+    journal = get_object_or_404(Journal, id=pk)
+    try:
+        commit_journal(journal)
+    except ValueError as e:
+        messages.warning(request, str(e))
     return redirect('fees:journals')
 
 
+@login_required
+def journal_legacy_deal_view(request, pk, client_id):
+    """Allocates an unallocated client of the journal to the deal of its legacy code match, once confirmed."""
+    journal = get_object_or_404(Journal, id=pk)
+    client = get_object_or_404(journal.get_accounts_with_null_deal(), id=client_id)
+    if request.method == 'POST':
+        try:
+            candidate = allocate_legacy_deal(client, request.user)
+        except ValueError as e:
+            messages.warning(request, str(e))
+        else:
+            messages.success(request, f'Client {client.client_code} allocated to deal {candidate.deal} '
+                                      f'of client {candidate.client_code}.')
+    return redirect('fees:journal-detail', pk=pk)
+
+
+@login_required
+def journal_commit_background_view(request, pk):
+    journal = get_object_or_404(Journal, id=pk)
+    try:
+        enqueue_commit(journal, request.user)
+    except ValueError as e:
+        messages.warning(request, str(e))
+    else:
+        messages.success(request, 'Commit queued for background processing.')
+    return redirect('fees:journal-detail', pk=pk)
+
+
+@login_required
+def client_search_api_view(request):
+    """JSON client search: q, producer, deal and unallocated filter the clients, after and before page them."""
+    filters = {}
+    for name in ('producer', 'deal'):
+        if request.GET.get(name, '').isdigit():
+            filters[name] = int(request.GET[name])
+    page = search_clients(
+        request.GET.get('q', ''), unallocated=request.GET.get('unallocated') == '1', **filters,
+        **keyset_params(request.GET),
+    )
+    return JsonResponse({
+        'results': page.rows,
+        'next_after': page.next_after,
+        'previous_before': page.previous_before,
+    })
+
+
+@login_required
+def journal_job_status_view(request, pk):
+    job_id = request.GET.get('job', '')
+    if not job_id.isdigit():
+        raise Http404('Unknown job.')
+    job = get_object_or_404(JournalJob, journal_id=pk, id=int(job_id))
+    return JsonResponse({
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'rows_parsed': job.rows_parsed,
+        'details_inserted': job.details_inserted,
+        'rows_dropped': job.rows_dropped,
+        'fees_generated': job.fees_generated,
+        'error': job.error,
+    })
+
+
+# EXPORT VIEWS **************************************************************************************
+
+def _export(queryset, columns, file_format, filename):
+    try:
+        return export_response(queryset, columns, file_format, filename)
+    except ValueError as e:
+        raise Http404(str(e))
+
+
+@login_required
+def journal_export_view(request, pk, file_format):
+    journal = get_object_or_404(Journal, id=pk)
+    details = journal.details.order_by('id')
+    return _export(details, JOURNAL_DETAIL_COLUMNS, file_format, f'journal_{journal.id}_details')
+
+
+@login_required
+def period_fees_export_view(request, period_id, file_format):
+    period = get_object_or_404(CommissionPeriod, id=period_id)
+    fees = Fee.objects.filter(detail__journal__commission_period=period).order_by('detail__journal_id', 'detail_id', 'id')
+    return _export(fees, FEE_COLUMNS, file_format, f'fees_{period}')
+
 
+@login_required
+def agent_statement_export_view(request, pk, period_id, file_format):
+    agent = get_object_or_404(Agent, id=pk)
+    period = get_object_or_404(CommissionPeriod, id=period_id)
+    lines = AgentStatementLine.objects.filter(agent=agent, period=period).order_by('id')
+    return _export(lines, STATEMENT_COLUMNS, file_format, f'statement_{agent.agent_code}_{period}')
@@ -8,10 +8,10 @@ This module is designed for:
 -parsing files uploaded by the user (ultimately from an external producer)
 -converting them for submission to the database (as JournalDetail objects)
 
-File paths should be passed (along with the Producer) into the clean_file function.
-The dictionary in the process function maps the Producer to the Producer-specific formatting function.
-each Producer function uses a parsing.FileBase class instance with methods for cleaning the raw data.
-The Producer function is also wrapped in a decorator that performs format validation and column renaming.
+Files should be passed (along with the Producer) into ProducerCleanerRegistry.clean.
+Each Producer's statement format is declared as a ProducerFormatSpec, compiled into a ParsePlan and registered with
+the ProducerCleanerRegistry. The plan reads the file with a FileParser and runs the shared ParsePipeline, which
+performs format validation and column renaming.
 
 ***************************************************************************************
 """
@@ -21,13 +21,11 @@ import numpy as np
 
 
 if __name__ == '__main__':
-    import file_parsing as parsing
-    from file_parsing import ParsePipeline, FileParserConfig
     from producer_dispatcher import ProducerCleanerRegistry
+    from producer_spec import BkgeCodeRule, FillRule, ParsePlan, ProducerFormatSpec
 else:
-    from . import file_parsing as parsing
     from .producer_dispatcher import ProducerCleanerRegistry
-    from .file_parsing import ParsePipeline, FileParserConfig
+    from .producer_spec import BkgeCodeRule, FillRule, ParsePlan, ProducerFormatSpec
 
 
 REQUIRED_COLUMNS = {
@@ -85,93 +83,82 @@ def clean_and_cast_columns(df: pd.DataFrame, required_columns: dict) -> pd.DataF
 
 """
 ***************************************************************************************
-Producer-specific Processing Functions
-These functions are specific to a Producer's data format and are called via the 'process' function.
-Each function takes the uploaded file as input and creates an UploadedFileBase instance to store the dataframe.
-The Producer functions are decorated with the @formatter decorator, which performs validation and column renaming.
-The functions output the UploadedFileBase.data dataframe after making transformations to it.
+Producer-specific Formats
+Each Producer's statement layout is described by a ProducerFormatSpec rather than hand-written pandas code.
+register_spec compiles the spec into a ParsePlan (which reads only the columns the spec needs) and registers the
+plan's parsers with the ProducerCleanerRegistry.
 ***************************************************************************************
 """
 
 
-@ProducerCleanerRegistry.register("SFG")
-def sfg_parser(file):
-    column_mapping = {'Loan ID': 'account_code', 'Client': 'name',
-            'Net Commission (ex GST)': 'amount',
-            'Gross Commission (ex GST)': 'lender_amount',
-            'Gross Commission (GST)': 'lender_gst',
-            'Net Commission GST': 'gst', 'Broker Name': 'external_adviser',
-            'Lender': 'product', 'Settlement Amount': 'loan_limit',
-            'Loan Balance/Amount': 'balance', 'bkge_code': 'bkge_code'}
-    config = FileParserConfig(header_row=0, tab_pattern=r'(Upfront|Clawback|Trail) Details')
-    parser = parsing.FileParser(file, config)
-    parser.process_xlsx()
-    bkg = {'Upfront Details': 'MXI', 'Trail Details': 'MXO', 'Clawback Details': 'MXR'}
-    parser.data['bkge_code'] = parser.data['sheet_name'].map(bkg)
-    df = (
-        ParsePipeline(parser.data)
-        .clean_columns()
-        .standardise(column_mapping, REQUIRED_COLUMNS)
-        .clean_accounts()
-        .result()
-    )
-    return df
-
-
-@ProducerCleanerRegistry.register("SQ1")
-def _sq1(file):
-    column_mapping = {'Account Number': 'account_code', 'Borrower': 'name',
-            'Payment': 'amount',
-            'GST': 'gst',
-            'Commission': 'lender_amount',
-            'Original Broker': 'external_adviser',
-            'lender_gst': 'lender_gst',
-            'Lender': 'product', 'Loan Amt': 'loan_limit',
-            'Loan Bal': 'balance', 'bkge_code': 'bkge_code'}
-    config = FileParserConfig(header_row=5, skip_footer=1)
-    parser = parsing.FileParser(file, config)
-    parser.process_xlsx()
-
-    parser.data['Borrower'] = parser.data['Borrower'].fillna(parser.data['Loan Bal'])
-    parser.data['Account Number'] = parser.data['Account Number'].fillna(parser.data['Loan Bal'])
-    parser.data['Loan Bal'] = 0.0
-    parser.data['lender_gst'] = parser.data['GST'] / parser.data['Comm Rate']
-    bkg = {'Trails': 'MXO', 'Upfront': 'MXI'}
-    parser.data['bkge_code'] = bkg[parser.raw_data['Sheet1'].values[4][1]]
-    df = (
-        ParsePipeline(parser.data)
-        .clean_columns()
-        .standardise(column_mapping, REQUIRED_COLUMNS)
-        .clean_accounts()
-        .result()
-    )
-    return df
-
-
-@ProducerCleanerRegistry.register("FNS")
-def _finsure(file):
-    column_mapping = {'Loan Account Number': 'account_code', 'Client': 'name',
-            'Amount Paid': 'amount',
-            'GST Paid': 'gst',
-            'lender_amount': 'lender_amount',
-            'lender_gst': 'lender_gst',
-            'Lender': 'product', 'loan_limit': 'loan_limit',
-            'Loan Balance': 'balance', 'bkge_code': 'bkge_code'}
-    config = FileParserConfig(skip_footer=1)
-    parser = parsing.FileParser(file, config)
-    parser.process_html(data_index_number=0)
-    parser.data['Loan Account Number'] = parser.data['Loan Account Number'].fillna('0')
-    parser.data.loc[parser.data['Commission Type']=='Adjustments*', 'Commission Type'] = 'ADJUST'
-    parser.data['loan_limit'] = parser.data['Loan Balance']
-    bkg = {'TRAIL': 'MXO', 'ADJUST': 'FNS', 'UPFRONT': 'MXI'}
-    parser.data['bkge_code'] = parser.data['Commission Type'].map(bkg)
-    df = (
-        ParsePipeline(parser.data)
-        .clean_columns()
-        .standardise(column_mapping, REQUIRED_COLUMNS)
-        .clean_accounts()
-        .result()
-    )
-    return df
-
-
+def register_spec(spec: ProducerFormatSpec) -> ParsePlan:
+    plan = spec.compile(REQUIRED_COLUMNS)
+    ProducerCleanerRegistry.specs[spec.name] = spec
+    ProducerCleanerRegistry.register(spec.name)(plan.parse)
+    if plan.streams:
+        ProducerCleanerRegistry.register_stream(spec.name)(plan.parse_chunks)
+    return plan
+
+
+SFG_SPEC = ProducerFormatSpec(
+    name='SFG',
+    column_mapping={'Loan ID': 'account_code', 'Client': 'name',
+        'Net Commission (ex GST)': 'amount',
+        'Gross Commission (ex GST)': 'lender_amount',
+        'Gross Commission (GST)': 'lender_gst',
+        'Net Commission GST': 'gst', 'Broker Name': 'external_adviser',
+        'Lender': 'product', 'Settlement Amount': 'loan_limit',
+        'Loan Balance/Amount': 'balance', 'bkge_code': 'bkge_code'},
+    bkge=BkgeCodeRule(
+        column='sheet_name', codes={'Upfront Details': 'MXI', 'Trail Details': 'MXO', 'Clawback Details': 'MXR'}
+    ),
+    header_row=0,
+    tab_pattern=r'(Upfront|Clawback|Trail) Details',
+    parallel_sheets=True,
+)
+SFG_PLAN = register_spec(SFG_SPEC)
+
+
+SQ1_SPEC = ProducerFormatSpec(
+    name='SQ1',
+    column_mapping={'Account Number': 'account_code', 'Borrower': 'name',
+        'Payment': 'amount',
+        'GST': 'gst',
+        'Commission': 'lender_amount',
+        'Original Broker': 'external_adviser',
+        'lender_gst': 'lender_gst',
+        'Lender': 'product', 'Loan Amt': 'loan_limit',
+        'Loan Bal': 'balance', 'bkge_code': 'bkge_code'},
+    # the statement type is printed in the second cell of the fifth row, above the header
+    bkge=BkgeCodeRule(cell=('Sheet1', 4, 1), codes={'Trails': 'MXO', 'Upfront': 'MXI'}),
+    header_row=5,
+    skip_footer=1,
+    fills=(
+        FillRule('Borrower', from_column='Loan Bal'),
+        FillRule('Account Number', from_column='Loan Bal'),
+    ),
+    assign=(
+        ('Loan Bal', '0.0'),
+        ('lender_gst', '`GST` / `Comm Rate`'),
+    ),
+)
+SQ1_PLAN = register_spec(SQ1_SPEC)
+
+
+FNS_SPEC = ProducerFormatSpec(
+    name='FNS',
+    reader='html',
+    column_mapping={'Loan Account Number': 'account_code', 'Client': 'name',
+        'Amount Paid': 'amount',
+        'GST Paid': 'gst',
+        'lender_amount': 'lender_amount',
+        'lender_gst': 'lender_gst',
+        'Lender': 'product', 'loan_limit': 'loan_limit',
+        'Loan Balance': 'balance', 'bkge_code': 'bkge_code'},
+    bkge=BkgeCodeRule(column='Commission Type', codes={'TRAIL': 'MXO', 'ADJUST': 'FNS', 'UPFRONT': 'MXI'}),
+    skip_footer=1,
+    fills=(FillRule('Loan Account Number', value='0'),),
+    replace={'Commission Type': {'Adjustments*': 'ADJUST'}},
+    assign=(('loan_limit', '`Loan Balance`'),),
+)
+FNS_PLAN = register_spec(FNS_SPEC)
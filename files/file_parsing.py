@@ -2,10 +2,20 @@
 import pandas as pd
 import re
 import io
+import os
+import multiprocessing
+import openpyxl
+from openpyxl.cell.cell import ERROR_CODES
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from typing import (Literal, Optional)
 from dataclasses import dataclass, field
-from typing import Union, Any
+from typing import Union, Any, Iterator
+
+DEFAULT_CHUNK_SIZE = 5000
+# bump when changes to the shared parsing steps alter cleaned output, so cached parses are not reused
+PARSER_VERSION = 2
 
 
 @dataclass
@@ -15,6 +25,14 @@ class FileParserConfig:
     skip_rows: Optional[int] = 0
     tab_pattern: Optional[str] = None
     engine: Literal['openpyxl', 'xlrd'] = 'openpyxl'
+    # parse the sheets matching tab_pattern on a process pool instead of one after another, for workbooks of at
+    # least parallel_min_bytes; smaller ones parse faster than the pool starts
+    parallel_sheets: bool = False
+    parallel_min_bytes: int = 1024 * 1024
+    # source columns to keep (by header name, with newlines read as spaces); None keeps every column
+    usecols: Optional[tuple] = None
+    # {source column: dtype} applied as the columns are read
+    dtype: Optional[dict] = None
 
     def __post_init__(self):
         self.skip_footer = max(0, self.skip_footer or 0)
@@ -22,6 +40,17 @@ class FileParserConfig:
         if self.header_row is not None:
             self.header_row = max(0, self.header_row)
 
+    @classmethod
+    def from_column_mapping(cls, column_mapping: dict, required_columns: dict, extra_columns=(), **options):
+        """
+        Reads only the source columns whose targets are in required_columns, plus extra_columns. Sources of text
+        targets are read as str; numeric sources are left to the readers, as they may hold '$1,234' strings.
+        """
+        mapping = {source: target for source, target in column_mapping.items() if target in required_columns}
+        usecols = tuple(sorted(set(mapping) | set(extra_columns)))
+        dtype = {source: str for source, target in mapping.items() if required_columns[target] is str}
+        return cls(usecols=usecols, dtype=dtype, **options)
+
 
 class FileParser:
     def __init__(self, file_obj: Union[str, InMemoryUploadedFile], config: FileParserConfig):
@@ -31,20 +60,34 @@ class FileParser:
         self.data = None
 
     def process_xlsx(self):
-        self.raw_data = self._read_excel(read_header=False)
-        sheets = self._read_excel(read_header=True)
-        filtered = self._filter_sheets(sheets)
+        if self._reads_pruned_xlsx():
+            # only the usecols cells are taken from each row; raw_data keeps just the rows above the header
+            sheets = self._read_excel_pruned()
+            self.raw_data = {name: preface for name, (preface, _) in sheets.items()}
+            bodies = {name: body for name, (_, body) in sheets.items()}
+        else:
+            # read every sheet once without a header; header, body and footer are sliced from the raw cells
+            self.raw_data = self._read_excel_raw()
+            bodies = {name: self._slice_sheet(raw) for name, raw in self.raw_data.items()}
+        filtered = self._filter_sheets(bodies)
         self.data = pd.concat(filtered.values(), ignore_index=True)
 
     def process_csv(self):
         stream = self._get_csv_stream()
-        self.raw_data = pd.read_csv(stream)
+        if self.config.usecols is None:
+            self.raw_data = pd.read_csv(stream)
+        elif self.config.skip_rows:
+            self.raw_data = pd.read_csv(stream, header=None, nrows=self.config.skip_rows)
+        else:
+            self.raw_data = pd.DataFrame()
         stream.seek(0)
         self.data = pd.read_csv(
             stream,
             skiprows=self.config.skip_rows or 0,
             skipfooter=self.config.skip_footer or 0,
-            engine='python'
+            engine='python',
+            usecols=self._keep_column if self.config.usecols is not None else None,
+            dtype=self.config.dtype,
         )
 
     def process_html(self, data_index_number=0):
@@ -59,18 +102,174 @@ class FileParser:
         if self.config.skip_footer:
             df = df.iloc[:-self.config.skip_footer]
 
-        self.data = df.reset_index(drop=True)
-
-    def _read_excel(self, read_header=True):
-        header = self.config.header_row if read_header else None
-        stream = self._get_excel_stream()
-        return pd.read_excel(
+        self.data = self._prune(df).reset_index(drop=True)
+
+    def iter_xlsx_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        """
+        Streams the workbook in DataFrames of at most chunk_size rows using openpyxl's read-only mode, so memory use
+        does not grow with the size of the file. Rows above the header are kept in raw_data (one frame per sheet).
+        """
+        if self.config.engine != 'openpyxl':
+            raise ValueError("Streaming is only supported for openpyxl workbooks.")
+        workbook = openpyxl.load_workbook(self._get_file_handle(), read_only=True, data_only=True)
+        self.raw_data = {}
+        try:
+            for sheet_name in workbook.sheetnames:
+                if self.config.tab_pattern and not re.match(self.config.tab_pattern, sheet_name):
+                    continue
+                chunks = self._iter_sheet_chunks(workbook[sheet_name], sheet_name, chunk_size)
+                yield from _drop_footer(chunks, self.config.skip_footer)
+        finally:
+            workbook.close()
+
+    def iter_csv_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        if isinstance(self.file_obj, str):
+            stream = self.file_obj
+        else:
+            self.file_obj.seek(0)
+            stream = io.TextIOWrapper(getattr(self.file_obj, 'file', self.file_obj), encoding='utf-8')
+        chunks = pd.read_csv(
             stream,
-            header=header,
-            sheet_name=None,
-            engine=self.config.engine,
-            skipfooter=self.config.skip_footer or 0,
+            skiprows=self.config.skip_rows or 0,
+            chunksize=chunk_size,
+            usecols=self._keep_column if self.config.usecols is not None else None,
+            dtype=self.config.dtype,
         )
+        yield from _drop_footer(chunks, self.config.skip_footer)
+
+    def _iter_sheet_chunks(self, worksheet, sheet_name, chunk_size):
+        rows = worksheet.iter_rows(values_only=True)
+        columns = positions = None
+        if self.config.header_row is not None:
+            self.raw_data[sheet_name], columns, positions = self._read_header(rows)
+        else:
+            self.raw_data[sheet_name] = pd.DataFrame()
+
+        buffer = []
+        for row in rows:
+            if _is_blank(row):
+                continue
+            buffer.append(row if positions is None else _select_cells(row, positions))
+            if len(buffer) == chunk_size:
+                yield self._rows_to_frame(buffer, columns, sheet_name)
+                buffer = []
+        if buffer:
+            yield self._rows_to_frame(buffer, columns, sheet_name)
+
+    def _rows_to_frame(self, rows, columns, sheet_name):
+        df = self._prune(pd.DataFrame.from_records(rows, columns=columns))
+        if self.config.tab_pattern:
+            df['sheet_name'] = sheet_name
+        return df
+
+    def _read_header(self, rows):
+        """
+        Consumes the rows up to and including the header row. Returns the rows above the header as a frame, the
+        names of the columns to keep and their positions in each row.
+        """
+        preface = []
+        names = []
+        for row in rows:
+            if len(preface) == self.config.header_row:
+                names = _header_names([_excel_value(cell) for cell in row])
+                break
+            preface.append(tuple(_excel_value(cell) for cell in row))
+        positions = [i for i, name in enumerate(names) if self.config.usecols is None or self._keep_column(name)]
+        return pd.DataFrame(preface), [names[i] for i in positions], positions
+
+    def _reads_pruned_xlsx(self) -> bool:
+        return (self.config.usecols is not None and self.config.header_row is not None
+                and self.config.engine == 'openpyxl')
+
+    def _read_excel_pruned(self) -> dict:
+        stream = self._get_excel_stream()
+        workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        try:
+            sheet_names = [name for name in workbook.sheetnames
+                           if not self.config.tab_pattern or re.match(self.config.tab_pattern, name)]
+            if not self._parallel_sheets(stream, sheet_names):
+                return {name: self._read_pruned_sheet(workbook[name]) for name in sheet_names}
+        finally:
+            workbook.close()
+
+        source = stream if isinstance(stream, str) else stream.getvalue()
+        with ProcessPoolExecutor(max_workers=min(len(sheet_names), os.cpu_count() or 1)) as pool:
+            sheets = pool.map(_read_pruned_excel_sheet, repeat(source), sheet_names, repeat(self.config))
+            return dict(zip(sheet_names, sheets))
+
+    def _parallel_sheets(self, stream, sheet_names) -> bool:
+        """
+        Whether to read sheet_names on a process pool: config.parallel_sheets is set, there is more than one sheet,
+        the workbook is at least config.parallel_min_bytes, and this is not already a worker process (a batch
+        upload's parse, for one), where the pools would nest.
+        """
+        if not (self.config.parallel_sheets and len(sheet_names) > 1):
+            return False
+        size = os.path.getsize(stream) if isinstance(stream, str) else stream.getbuffer().nbytes
+        return size >= self.config.parallel_min_bytes and multiprocessing.parent_process() is None
+
+    def _read_pruned_sheet(self, worksheet):
+        """Reads one sheet as read_excel would (interior blank rows kept, trailing ones trimmed), usecols only."""
+        rows = worksheet.iter_rows(values_only=True)
+        preface, columns, positions = self._read_header(rows)
+        body = []
+        last_row_with_data = -1
+        for row in rows:
+            if not _is_blank(row):
+                last_row_with_data = len(body)
+            body.append(_select_cells(row, positions))
+        end = max(0, last_row_with_data + 1 - (self.config.skip_footer or 0))
+        body = pd.DataFrame.from_records(body[:end], columns=columns)
+        return preface, self._prune(body).infer_objects()
+
+    def _read_excel_raw(self):
+        stream = self._get_excel_stream()
+        if not self.config.tab_pattern:
+            return pd.read_excel(stream, header=None, sheet_name=None, engine=self.config.engine)
+
+        # list the sheet names first so only the sheets matching tab_pattern are parsed
+        with pd.ExcelFile(stream, engine=self.config.engine) as workbook:
+            sheet_names = [name for name in workbook.sheet_names if re.match(self.config.tab_pattern, name)]
+            if not self._parallel_sheets(stream, sheet_names):
+                return workbook.parse(sheet_name=sheet_names, header=None)
+
+        source = stream if isinstance(stream, str) else stream.getvalue()
+        with ProcessPoolExecutor(max_workers=min(len(sheet_names), os.cpu_count() or 1)) as pool:
+            frames = pool.map(_read_excel_sheet, repeat(source), sheet_names, repeat(self.config.engine))
+            return dict(zip(sheet_names, frames))
+
+    def _slice_sheet(self, raw: pd.DataFrame) -> pd.DataFrame:
+        """Applies header_row and skip_footer to a sheet read with header=None, as read_excel would."""
+        end = len(raw) - (self.config.skip_footer or 0)
+        if self.config.header_row is None:
+            body = raw.iloc[:end]
+        else:
+            body = raw.iloc[self.config.header_row + 1:end]
+            body.columns = _header_names(raw.iloc[self.config.header_row].tolist())
+        return self._prune(body).reset_index(drop=True).infer_objects()
+
+    def _keep_column(self, name) -> bool:
+        return isinstance(name, str) and name.replace('\n', ' ') in self.config.usecols
+
+    def _column_dtype(self, name):
+        if not isinstance(name, str):
+            return None
+        return (self.config.dtype or {}).get(name.replace('\n', ' '))
+
+    def _prune(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Keeps only config.usecols and applies config.dtype; text dtypes leave blank cells blank."""
+        if self.config.usecols is not None:
+            df = df[[col for col in df.columns if self._keep_column(col)]]
+        casts = {}
+        for name in df.columns:
+            dtype = self._column_dtype(name)
+            if dtype is str:
+                casts[name] = df[name].where(df[name].isna(), df[name].astype(str))
+            elif dtype is not None:
+                casts[name] = df[name].astype(dtype)
+        if casts:
+            df = df.assign(**casts)
+        return df
 
     def _get_excel_stream(self):
         if isinstance(self.file_obj, str):
@@ -79,6 +278,12 @@ class FileParser:
         self.file_obj.seek(0)
         return io.BytesIO(content)
 
+    def _get_file_handle(self):
+        if isinstance(self.file_obj, str):
+            return self.file_obj
+        self.file_obj.seek(0)
+        return self.file_obj
+
     def _get_csv_stream(self):
         if isinstance(self.file_obj, str):
             return open(self.file_obj, 'r')
@@ -101,6 +306,68 @@ class FileParser:
         return dfs
 
 
+def _read_excel_sheet(source: Union[str, bytes], sheet_name: str, engine: str) -> pd.DataFrame:
+    """Reads a single sheet without a header. Runs in a worker process for FileParserConfig.parallel_sheets."""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return pd.read_excel(source, header=None, sheet_name=sheet_name, engine=engine)
+
+
+def _read_pruned_excel_sheet(source: Union[str, bytes], sheet_name: str, config: FileParserConfig):
+    """Worker for FileParser._read_excel_pruned when config.parallel_sheets is set."""
+    parser = FileParser(io.BytesIO(source) if isinstance(source, bytes) else source, config)
+    workbook = openpyxl.load_workbook(parser._get_file_handle(), read_only=True, data_only=True)
+    try:
+        return parser._read_pruned_sheet(workbook[sheet_name])
+    finally:
+        workbook.close()
+
+
+def _excel_value(value):
+    """Converts a cell value as read_excel does: blanks and error codes become None and whole floats become ints."""
+    if value is None or value == '' or (isinstance(value, str) and value in ERROR_CODES):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _select_cells(row: tuple, positions: list) -> tuple:
+    width = len(row)
+    return tuple(_excel_value(row[i]) if i < width else None for i in positions)
+
+
+def _is_blank(row: tuple) -> bool:
+    return all(cell is None or cell == '' for cell in row)
+
+
+def _header_names(values: list) -> list:
+    """Names columns from a header row the way pandas does: blanks become 'Unnamed: i', duplicates get '.n'."""
+    names = []
+    seen = {}
+    for i, value in enumerate(values):
+        name = f"Unnamed: {i}" if pd.isna(value) else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _drop_footer(chunks: Iterator[pd.DataFrame], skip_footer: int) -> Iterator[pd.DataFrame]:
+    """Holds back the last skip_footer rows of a stream of chunks so footers can be dropped without reading ahead."""
+    pending = None
+    for chunk in chunks:
+        if not skip_footer:
+            yield chunk
+            continue
+        combined = chunk if pending is None else pd.concat([pending, chunk], ignore_index=True)
+        if len(combined) > skip_footer:
+            yield combined.iloc[:-skip_footer].reset_index(drop=True)
+        pending = combined.iloc[-skip_footer:]
+
 
 # ------------------------------------------------------------------------------
 # Standalone utility functions
@@ -130,8 +397,24 @@ def column_fill(data: pd.DataFrame, column: str, new_column=None, query_filter=N
         data[new_column] = data[column].ffill()
     return data
 
-def clean_numeric_strings(data: pd.DataFrame) -> pd.DataFrame:
-    data = data.map(lambda x: re.sub(r"[$,]+", "", x) if isinstance(x, str) else x)
+NUMERIC_STRING_PATTERN = re.compile(r"[$,]+")
+
+
+def clean_numeric_strings(data: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """
+    Strips '$' and ',' from the strings in the given columns (all columns by default). Only object columns are
+    touched; columns pandas already parsed as numbers are skipped, as are non-string cells in mixed columns.
+    """
+    columns = data.columns if columns is None else [col for col in columns if col in data.columns]
+    for col in columns:
+        if data[col].dtype != object:
+            continue
+        try:
+            cleaned = data[col].str.replace(NUMERIC_STRING_PATTERN, '', regex=True)
+        except AttributeError:
+            # no string values in the column
+            continue
+        data[col] = cleaned.where(cleaned.notna(), data[col])
     return data
 
 
@@ -175,7 +458,8 @@ class ParsePipeline:
     def standardise(self, column_mapping:dict, required_columns:dict):
         self._validate()
         self.df = self.df.rename(columns=column_mapping)
-        self.df = clean_numeric_strings(self.df)
+        numeric_columns = [col for col, dtype in required_columns.items() if dtype in (int, float)]
+        self.df = clean_numeric_strings(self.df, numeric_columns)
         for col, dtype in required_columns.items():
             if col not in self.df.columns:
                 self.df[col] = pd.Series([None] * len(self.df), dtype=dtype)
@@ -186,7 +470,7 @@ class ParsePipeline:
 
     def clean_accounts(self):
         if 'account_code' in self.df.columns:
-            self.df['account_code'] = self.df['account_code'].astype(str).str.replace('.0','', regex=True)
+            self.df['account_code'] = self.df['account_code'].astype(str).str.replace(r'\.0$', '', regex=True)
         return self
 
     def _validate(self):
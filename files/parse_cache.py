@@ -0,0 +1,111 @@
+"""
+Local disk cache of cleaned producer DataFrames.
+
+Operators often re-upload the same statement after fixing something on the journal. Parsed results are stored as
+Parquet files keyed by (producer code, SHA-256 of the file bytes, parser version), so a repeat upload skips the
+Excel/HTML parsing and ParsePipeline entirely. The cache is bounded by size and evicts least recently used entries.
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+from django.conf import settings
+
+from .producer_dispatcher import ProducerCleanerRegistry
+from .file_parsing import PARSER_VERSION
+
+
+class ParseCache:
+
+    def __init__(self, directory, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_settings(cls) -> 'ParseCache':
+        return cls(settings.PARSE_CACHE_DIR, settings.PARSE_CACHE_MAX_BYTES)
+
+    def key(self, producer: str, file) -> str:
+        version = ProducerCleanerRegistry.version(producer)
+        return f"{producer}-v{PARSER_VERSION}.{version}-{file_sha256(file)}"
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        path = self._path(key)
+        try:
+            df = pd.read_parquet(path)
+        except FileNotFoundError:
+            return None
+        # bump the modification time so eviction treats this entry as recently used
+        os.utime(path)
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> bool:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path)
+        except (ValueError, TypeError):
+            # columns with mixed python types can't be written to Parquet; such results just aren't cached
+            os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+        return True
+
+    def evict(self):
+        entries = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry) for entry in self.directory.glob('*.parquet')
+        )
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.parquet"
+
+
+def file_sha256(file) -> str:
+    if isinstance(file, str):
+        with open(file, 'rb') as f:
+            return file_sha256(f)
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(1024 * 1024), b''):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def cached_clean(producer: str, file, cache: ParseCache = None) -> pd.DataFrame:
+    """ProducerCleanerRegistry.clean, returning the cached result when the same file has been parsed before."""
+    cache = cache or ParseCache.from_settings()
+    key = cache.key(producer, file)
+    df = cache.get(key)
+    if df is None:
+        df = ProducerCleanerRegistry.clean(producer, file)
+        cache.put(key, df)
+    return df
+
+
+def cached_clean_chunks(producer: str, file, chunk_size: int, cache: ParseCache = None):
+    """
+    ProducerCleanerRegistry.clean_chunks, slicing the cached result when the file has been parsed before.
+    Streamed parses are not written to the cache, since that would mean holding the whole result in memory.
+    """
+    cache = cache or ParseCache.from_settings()
+    df = cache.get(cache.key(producer, file))
+    if df is None:
+        yield from ProducerCleanerRegistry.clean_chunks(producer, file, chunk_size)
+        return
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
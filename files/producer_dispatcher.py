@@ -2,6 +2,9 @@
 
 class ProducerCleanerRegistry:
     registry = {}
+    stream_registry = {}
+    # the ProducerFormatSpec each producer was registered from; its version keys the parse cache
+    specs = {}
 
     @classmethod
     def register(cls, name):
@@ -11,10 +14,35 @@ class ProducerCleanerRegistry:
             return func
         return decorator
 
+    @classmethod
+    def version(cls, producer) -> int:
+        spec = cls.specs.get(producer)
+        return spec.version if spec is not None else 0
+
+    @classmethod
+    def register_stream(cls, name):
+        def decorator(func):
+            cls.stream_registry[name] = func
+            return func
+        return decorator
+
     @classmethod
     def clean(cls, producer, file):
         if producer not in cls.registry:
             raise ValueError(f"Unsupported producer: {producer}")
         return cls.registry[producer](file)
 
-# add decorator to each producer function, e.g:  @register_producer("SFG")
\ No newline at end of file
+    @classmethod
+    def clean_chunks(cls, producer, file, chunk_size):
+        """
+        Yields cleaned DataFrames of at most chunk_size rows. Producers without a streaming cleaner (e.g. HTML
+        statements, which cannot be read incrementally) are cleaned in full and then sliced.
+        """
+        if producer in cls.stream_registry:
+            yield from cls.stream_registry[producer](file, chunk_size)
+            return
+        df = cls.clean(producer, file)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+# add decorator to each producer function, e.g:  @register_producer("SFG")
@@ -0,0 +1,160 @@
+"""
+Declarative producer statement formats.
+
+A ProducerFormatSpec describes a producer's statement layout (reader, header and footer rows, column mapping, bkge
+code mapping and fill rules) instead of hand-writing pandas code for it. spec.compile() turns it into a ParsePlan,
+which reads only the source columns the output needs, with explicit text dtypes, applies the spec's rules in one
+pass and hands the result to ParsePipeline. Specs can be written in code or loaded from JSON/YAML via from_dict.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Iterator, Literal, Optional
+
+import pandas as pd
+
+if __name__ == '__main__':
+    from file_parsing import FileParser, FileParserConfig, ParsePipeline
+else:
+    from .file_parsing import FileParser, FileParserConfig, ParsePipeline
+
+# column names are quoted with backticks in assign expressions, as DataFrame.eval expects for names with spaces
+EXPRESSION_COLUMN_PATTERN = re.compile(r"`([^`]+)`")
+
+
+@dataclass(frozen=True)
+class FillRule:
+    """Fills blanks in column with value, or with the same row of from_column."""
+    column: str
+    value: object = None
+    from_column: Optional[str] = None
+
+    def __post_init__(self):
+        if (self.value is None) == (self.from_column is None):
+            raise ValueError(f"FillRule for {self.column} needs exactly one of value or from_column.")
+
+
+@dataclass(frozen=True)
+class BkgeCodeRule:
+    """
+    Maps a statement value to a bkge code through codes. The value comes from a column of the statement (use
+    'sheet_name' for tab-pattern workbooks) or from a single (sheet, row, column) cell above the header.
+    """
+    codes: dict
+    column: Optional[str] = None
+    cell: Optional[tuple] = None
+
+    def __post_init__(self):
+        if (self.column is None) == (self.cell is None):
+            raise ValueError("BkgeCodeRule needs exactly one of column or cell.")
+
+
+@dataclass(frozen=True)
+class ProducerFormatSpec:
+    name: str
+    column_mapping: dict
+    bkge: BkgeCodeRule
+    reader: Literal['xlsx', 'csv', 'html'] = 'xlsx'
+    header_row: Optional[int] = None
+    skip_footer: int = 0
+    skip_rows: int = 0
+    tab_pattern: Optional[str] = None
+    parallel_sheets: bool = False
+    html_table: int = 0
+    fills: tuple = ()
+    # {column: {old value: new value}}, applied before bkge codes are mapped
+    replace: dict = field(default_factory=dict)
+    # (column, DataFrame.eval expression) pairs, evaluated in order after fills and replacements
+    assign: tuple = ()
+    # bump whenever the spec's output changes, so cached parses are not reused
+    version: int = 1
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ProducerFormatSpec':
+        data = dict(data)
+        bkge = dict(data.pop('bkge'))
+        if bkge.get('cell') is not None:
+            bkge['cell'] = tuple(bkge['cell'])
+        fills = tuple(FillRule(**fill) for fill in data.pop('fills', ()))
+        assign = tuple(tuple(pair) for pair in data.pop('assign', ()))
+        return cls(bkge=BkgeCodeRule(**bkge), fills=fills, assign=assign, **data)
+
+    def compile(self, required_columns: dict) -> 'ParsePlan':
+        """Works out which source columns are read, and as what dtype, to produce required_columns."""
+        mapping = {source: target for source, target in self.column_mapping.items() if target in required_columns}
+        # a source column is read unless an assign expression overwrites it before anything uses it; bkge_code is
+        # always produced from the bkge rule
+        produced = {column for column, _ in self.assign} | {'bkge_code'}
+        extra_columns = {column for fill in self.fills for column in (fill.column, fill.from_column) if column}
+        extra_columns.update(self.replace)
+        assigned = set()
+        for column, expression in self.assign:
+            extra_columns.update(set(EXPRESSION_COLUMN_PATTERN.findall(expression)) - assigned)
+            assigned.add(column)
+        if self.bkge.column and self.bkge.column != 'sheet_name':
+            extra_columns.add(self.bkge.column)
+
+        config = FileParserConfig.from_column_mapping(
+            {source: target for source, target in mapping.items() if source not in produced},
+            required_columns, extra_columns=extra_columns,
+            header_row=self.header_row, skip_footer=self.skip_footer, skip_rows=self.skip_rows,
+            tab_pattern=self.tab_pattern, parallel_sheets=self.parallel_sheets,
+        )
+        return ParsePlan(self, config, mapping, required_columns)
+
+
+@dataclass(frozen=True)
+class ParsePlan:
+    spec: ProducerFormatSpec
+    config: FileParserConfig
+    column_mapping: dict
+    required_columns: dict
+
+    @property
+    def streams(self) -> bool:
+        return self.spec.reader in ('xlsx', 'csv')
+
+    def parse(self, file) -> pd.DataFrame:
+        parser = FileParser(file, self.config)
+        if self.spec.reader == 'xlsx':
+            parser.process_xlsx()
+        elif self.spec.reader == 'csv':
+            parser.process_csv()
+        else:
+            parser.process_html(data_index_number=self.spec.html_table)
+        return self.transform(parser.data, parser.raw_data)
+
+    def parse_chunks(self, file, chunk_size: int) -> Iterator[pd.DataFrame]:
+        parser = FileParser(file, self.config)
+        if self.spec.reader == 'xlsx':
+            chunks = parser.iter_xlsx_chunks(chunk_size)
+        elif self.spec.reader == 'csv':
+            chunks = parser.iter_csv_chunks(chunk_size)
+        else:
+            raise ValueError(f"{self.spec.reader} statements cannot be streamed.")
+        for chunk in chunks:
+            yield self.transform(chunk, parser.raw_data)
+
+    def transform(self, data: pd.DataFrame, raw_data) -> pd.DataFrame:
+        spec = self.spec
+        for fill in spec.fills:
+            data[fill.column] = data[fill.column].fillna(data[fill.from_column] if fill.from_column else fill.value)
+        for column, replacements in spec.replace.items():
+            data[column] = data[column].replace(replacements)
+        for column, expression in spec.assign:
+            data[column] = data.eval(expression)
+        data['bkge_code'] = self._bkge_codes(data, raw_data)
+        return (
+            ParsePipeline(data)
+            .clean_columns()
+            .standardise(self.column_mapping, self.required_columns)
+            .clean_accounts()
+            .result()
+        )
+
+    def _bkge_codes(self, data, raw_data):
+        rule = self.spec.bkge
+        if rule.column:
+            return data[rule.column].map(rule.codes)
+        sheet, row, col = rule.cell
+        return rule.codes[raw_data[sheet].values[row][col]]
@@ -1,3 +1,223 @@
-from django.test import TestCase
+import io
 
-# Create your tests here.
+import openpyxl
+import pandas as pd
+from django.test import SimpleTestCase
+
+from files.producer_dispatcher import ProducerCleanerRegistry
+from files.parse_cache import ParseCache, cached_clean, cached_clean_chunks
+
+
+def build_sq1_workbook(rows=23):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'Sheet1'
+    for preface_row in [['Square One Statement'], [], ['Period', '2025-01'], [], ['Type', 'Trails']]:
+        sheet.append(preface_row)
+    sheet.append(['Account Number', 'Borrower', 'Payment', 'GST', 'Commission', 'Original Broker', 'Lender',
+                  'Loan Amt', 'Loan Bal', 'Comm Rate'])
+    for i in range(rows):
+        sheet.append([10000 + i, f'Borrower {i}', 10.5 + i, 1.05, 12.0 + i, 'Ext', 'CBA', 500000, 400000 + i, 0.1])
+    sheet.append(['Total', None, 999])
+    stream = io.BytesIO()
+    workbook.save(stream)
+    stream.seek(0)
+    return stream
+
+
+def build_sfg_workbook(rows=17):
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for name in ['Summary', 'Upfront Details', 'Trail Details', 'Clawback Details']:
+        sheet = workbook.create_sheet(name)
+        sheet.append(['Loan ID', 'Client', 'Net Commission (ex GST)', 'Gross Commission (ex GST)',
+                      'Gross Commission (GST)', 'Net Commission GST', 'Broker Name', 'Lender', 'Settlement Amount',
+                      'Loan Balance/Amount', 'Notes'])
+        for i in range(rows):
+            sheet.append([f'L{i}', f'Client {i}', '$1,234.50', 2.0, 0.2, 0.1, 'Broker', 'ANZ', 1000, 900, 'note'])
+    stream = io.BytesIO()
+    workbook.save(stream)
+    stream.seek(0)
+    return stream
+
+
+def build_fns_statement():
+    rows = [
+        ['1001', 'Client A', '100.00', '10.00', 'ANZ', '250000', 'TRAIL'],
+        ['1002', 'Client B', '2,000.50', '200.05', 'CBA', '500000', 'UPFRONT'],
+        ['', 'Client C', '-5.00', '-0.50', 'NAB', '0', 'Adjustments*'],
+        ['Total', '', '2,095.50', '209.55', '', '', ''],
+    ]
+    header = ''.join(f'<th>{column}</th>' for column in [
+        'Loan Account Number', 'Client', 'Amount Paid', 'GST Paid', 'Lender', 'Loan Balance', 'Commission Type'])
+    body = ''.join('<tr>' + ''.join(f'<td>{value}</td>' for value in row) + '</tr>' for row in rows)
+    return io.BytesIO(f'<html><body><table><thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>'
+                      '</body></html>'.encode())
+
+
+class StreamingParseTestCase(SimpleTestCase):
+
+    def assert_stream_matches_full_parse(self, producer, build_workbook):
+        full = ProducerCleanerRegistry.clean(producer, build_workbook())
+        chunks = list(ProducerCleanerRegistry.clean_chunks(producer, build_workbook(), 5))
+        self.assertTrue(all(len(chunk) <= 5 for chunk in chunks))
+        pd.testing.assert_frame_equal(
+            pd.concat(chunks, ignore_index=True), full.reset_index(drop=True), check_dtype=False
+        )
+
+    def test_sq1_stream_matches_full_parse(self):
+        self.assert_stream_matches_full_parse('SQ1', build_sq1_workbook)
+
+    def test_sfg_stream_matches_full_parse(self):
+        self.assert_stream_matches_full_parse('SFG', build_sfg_workbook)
+
+
+class FileParserTestCase(SimpleTestCase):
+
+    def test_xlsx_read_once_and_sliced(self):
+        from unittest import mock
+        from files.file_parsing import FileParser, FileParserConfig
+        parser = FileParser(build_sq1_workbook(rows=4), FileParserConfig(header_row=5, skip_footer=1))
+        with mock.patch('files.file_parsing.pd.read_excel', wraps=pd.read_excel) as read_excel:
+            parser.process_xlsx()
+        self.assertEqual(read_excel.call_count, 1)
+        self.assertEqual(parser.data['Account Number'].tolist(), [10000, 10001, 10002, 10003])
+        self.assertEqual(parser.data['Payment'].dtype, float)
+        self.assertEqual(parser.raw_data['Sheet1'].values[4][1], 'Trails')
+
+    def test_pruned_xlsx_reads_only_usecols(self):
+        from unittest import mock
+        from files.file_parsing import FileParser, FileParserConfig
+        config = FileParserConfig(
+            header_row=5, skip_footer=1, usecols=('Account Number', 'Payment'), dtype={'Account Number': str}
+        )
+        parser = FileParser(build_sq1_workbook(rows=4), config)
+        with mock.patch('files.file_parsing.pd.read_excel', side_effect=AssertionError):
+            parser.process_xlsx()
+        self.assertEqual(list(parser.data.columns), ['Account Number', 'Payment'])
+        self.assertEqual(parser.data['Account Number'].tolist(), ['10000', '10001', '10002', '10003'])
+        self.assertEqual(parser.data['Payment'].dtype, float)
+        self.assertEqual(len(parser.raw_data['Sheet1']), 5)
+        self.assertEqual(parser.raw_data['Sheet1'].values[4][1], 'Trails')
+
+    def test_parallel_sheets_match_sequential_parse(self):
+        from files.file_parsing import FileParser, FileParserConfig
+        tab_pattern = r'(Upfront|Clawback|Trail) Details'
+        sequential = FileParser(build_sfg_workbook(), FileParserConfig(header_row=0, tab_pattern=tab_pattern))
+        sequential.process_xlsx()
+        parallel = FileParser(
+            build_sfg_workbook(),
+            FileParserConfig(header_row=0, tab_pattern=tab_pattern, parallel_sheets=True, parallel_min_bytes=0)
+        )
+        parallel.process_xlsx()
+        self.assertEqual(list(parallel.raw_data), ['Upfront Details', 'Trail Details', 'Clawback Details'])
+        self.assertEqual(parallel.data['sheet_name'].unique().tolist(), list(parallel.raw_data))
+        pd.testing.assert_frame_equal(parallel.data, sequential.data)
+
+    def test_no_process_pool_for_small_workbooks_or_inside_workers(self):
+        from unittest import mock
+        from files.file_parsing import FileParser, FileParserConfig
+        config = FileParserConfig(header_row=0, tab_pattern=r'(Upfront|Clawback|Trail) Details', parallel_sheets=True)
+        with mock.patch('files.file_parsing.ProcessPoolExecutor', side_effect=AssertionError):
+            FileParser(build_sfg_workbook(), config).process_xlsx()
+            config.parallel_min_bytes = 0
+            with mock.patch('files.file_parsing.multiprocessing.parent_process', return_value=object()):
+                FileParser(build_sfg_workbook(), config).process_xlsx()
+
+    def test_numeric_strings_cleaned_only_in_numeric_columns(self):
+        from files.file_parsing import clean_numeric_strings
+        df = pd.DataFrame({'amount': ['$1,234.50', 2.5, None], 'name': ['Smith, J', 'Lee, K', None]})
+        df = clean_numeric_strings(df, ['amount'])
+        self.assertEqual(df['amount'].tolist(), ['1234.50', 2.5, None])
+        self.assertEqual(df['name'].tolist(), ['Smith, J', 'Lee, K', None])
+
+    def test_clean_accounts_strips_only_trailing_float_suffix(self):
+        from files.file_parsing import ParsePipeline
+        df = pd.DataFrame({'account_code': [10000.0, '20305', '1012.0', 'A10.05']})
+        df = ParsePipeline(df).clean_accounts().result()
+        self.assertEqual(df['account_code'].tolist(), ['10000', '20305', '1012', 'A10.05'])
+
+
+class ParseCacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        import tempfile
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = ParseCache(directory.name, max_bytes=10 * 1024 * 1024)
+
+    def test_repeat_upload_skips_parsing(self):
+        from unittest import mock
+        # built once: openpyxl stamps the save time into the workbook, which would change its hash
+        content = build_sq1_workbook().getvalue()
+        first = cached_clean('SQ1', io.BytesIO(content), cache=self.cache)
+        with mock.patch.dict(ProducerCleanerRegistry.registry, {'SQ1': mock.Mock(side_effect=AssertionError)}):
+            second = cached_clean('SQ1', io.BytesIO(content), cache=self.cache)
+            chunks = list(cached_clean_chunks('SQ1', io.BytesIO(content), 10, cache=self.cache))
+        pd.testing.assert_frame_equal(second, first)
+        pd.testing.assert_frame_equal(pd.concat(chunks), first)
+
+    def test_least_recently_used_entries_evicted(self):
+        import os
+        df = pd.DataFrame({'account_code': [str(i) for i in range(1000)]})
+        self.cache.put('a', df)
+        self.cache.put('b', df)
+        os.utime(self.cache._path('a'), (0, 0))
+        self.cache.max_bytes = os.path.getsize(self.cache._path('b'))
+        self.cache.put('c', df)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+
+class ProducerFormatSpecTestCase(SimpleTestCase):
+
+    def test_plan_reads_only_needed_columns(self):
+        from files.file_manager import SFG_PLAN, SQ1_PLAN
+        self.assertNotIn('Notes', SFG_PLAN.config.usecols)
+        self.assertNotIn('Settlement Amount', SFG_PLAN.config.usecols)
+        self.assertEqual(SFG_PLAN.config.dtype['Loan ID'], str)
+        self.assertIn('Comm Rate', SQ1_PLAN.config.usecols)
+        self.assertNotIn('lender_gst', SQ1_PLAN.config.usecols)
+
+    def test_spec_loaded_from_json(self):
+        import json
+        from files.file_manager import REQUIRED_COLUMNS
+        from files.producer_spec import ProducerFormatSpec
+        spec = ProducerFormatSpec.from_dict(json.loads("""{
+            "name": "CSV", "reader": "csv", "skip_footer": 1,
+            "column_mapping": {"Loan": "account_code", "Paid": "amount", "Tax": "gst"},
+            "bkge": {"column": "Type", "codes": {"Trail": "MXO", "Upfront": "MXI"}},
+            "fills": [{"column": "Loan", "value": "0"}],
+            "assign": [["Tax", "`Paid` / 10"]]
+        }"""))
+        plan = spec.compile(REQUIRED_COLUMNS)
+        self.assertEqual(plan.config.usecols, ('Loan', 'Paid', 'Type'))
+        content = b"Loan,Paid,Type,Notes\n0012,1000,Trail,x\n,50,Upfront,y\nTotal,1050,,\n"
+        df = plan.parse(io.BytesIO(content))
+        self.assertEqual(df['account_code'].tolist(), ['0012', '0'])
+        self.assertEqual(df['bkge_code'].tolist(), ['MXO', 'MXI'])
+        self.assertEqual(df['amount'].tolist(), [1000.0, 50.0])
+        self.assertEqual(df['gst'].tolist(), [100.0, 5.0])
+
+    def test_fns_html_statement(self):
+        df = ProducerCleanerRegistry.clean('FNS', build_fns_statement())
+        self.assertEqual(df['account_code'].tolist(), ['1001', '1002', '0'])
+        self.assertEqual(df['name'].tolist(), ['Client A', 'Client B', 'Client C'])
+        self.assertEqual(df['product'].tolist(), ['ANZ', 'CBA', 'NAB'])
+        self.assertEqual(df['bkge_code'].tolist(), ['MXO', 'MXI', 'FNS'])
+        self.assertEqual(df['amount'].tolist(), [100.0, 2000.5, -5.0])
+        self.assertEqual(df['gst'].tolist(), [10.0, 200.05, -0.5])
+        self.assertEqual(df['balance'].tolist(), [250000.0, 500000.0, 0.0])
+
+    def test_fill_rule_needs_value_or_column(self):
+        from files.producer_spec import FillRule
+        with self.assertRaises(ValueError):
+            FillRule('Loan')
+        with self.assertRaises(ValueError):
+            FillRule('Loan', value='0', from_column='Client')
+
+    def test_cache_version_comes_from_spec(self):
+        from files.file_manager import SQ1_SPEC
+        self.assertEqual(ProducerCleanerRegistry.version('SQ1'), SQ1_SPEC.version)
+        self.assertEqual(ProducerCleanerRegistry.version('unknown'), 0)